@@ -1,9 +1,10 @@
+import queue
 import re
 import streamlit as st
 import math
 from mahjong.score import ScoreCalculator, AKA_MAN, AKA_PIN, AKA_SOU
 from mahjong.display import str2png, id2png
-from detection.detect import load_model, recognize, to_string
+from detection.detect import load_pool, preprocess, recognize, to_string
 from PIL import Image
 
 st.set_page_config(
@@ -51,21 +52,23 @@ with st.form(key="mahjong"):
     if btn and image:
         with st.spinner('正在努力识别中，请稍等片刻'):
             try:
-                image = Image.open(image)
-                model = load_model()
-                groups, res = recognize(model, image, conf / 100, False)
+                image = preprocess(Image.open(image))
+                with load_pool().acquire() as model:
+                    groups, res = recognize(model, image, conf / 100, False)
                 tile_string, hu_string = to_string(groups)
                 st.success("识别结果的图片与文本如下，您可将文本分别复制到下方的'牌面'栏与'和了牌'栏。如有识别错误，请进行手动修改并push开发者优化模型。")
                 col1, col2 = st.columns(2)
                 with col1:
                     st.image(image, use_column_width=True)
                 with col2:
-                    st.image(res, use_column_width=True)
+                    st.image(res.render(), use_column_width=True)
                 col1, col2 = st.columns([5, 1])
                 with col1:
                     st.code(tile_string, language=None)
                 with col2:
                     st.code(hu_string, language=None)
+            except (queue.Full, TimeoutError):
+                st.warning('当前识别请求较多，请稍后再试')
             except:
                 st.warning('未能检测到麻将牌，建议push开发者优化模型')
     col1, col2 = st.columns([5, 1])
@@ -0,0 +1,109 @@
+"""
+识图的asyncio接口
+
+同一时间窗口内到达的识图请求合并为一次model.predict（微批），在线程池中执行，不阻塞事件循环；
+同一模型的推理依次进行，不会并发调用predict。超时与取消见mahjong.aio.AsyncRunner，
+取消时尚未推理的图片不再计入批次。
+用法:
+    recognizer = AsyncRecognizer(load_model(), max_batch=8, max_delay=0.01, timeout=10)
+    groups = await recognizer.recognize(image, conf=0.5, to_str=False, display=False)
+    await recognizer.close()
+"""
+import asyncio
+
+from detection.detect import recognize_batch
+from mahjong.aio import AsyncRunner
+
+
+class AsyncRecognizer(AsyncRunner):
+
+    def __init__(self, model, max_batch=8, max_delay=0.01, executor=None, max_concurrency=None, timeout=None):
+        """
+        :param model: YOLO模型（见detection.detect.load_model）
+        :param max_batch: 每次推理的图片数上限
+        :param max_delay: 批次中第一个请求最多等待其他请求的时间（秒）
+        其余参数见AsyncRunner，执行器只能为线程池
+        """
+        super().__init__(executor, 'thread', 1, max_concurrency, timeout)
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = None
+        self._batcher = None
+        self._futures = set()
+        self._closed = False
+
+    async def recognize(self, file, conf=0.5, to_str=True, display=True, timeout=None):
+        """conf、to_str、display及结果同detection.detect.recognize（不支持切片推理等其余参数）"""
+        timeout = self.timeout if timeout is None else timeout
+        return await asyncio.wait_for(self._bounded(self._submit, file, (conf, to_str, display)), timeout)
+
+    async def _submit(self, file, options):
+        if self._closed:
+            raise RuntimeError('AsyncRecognizer is closed!')
+        if self._batcher is None or self._batcher.done():
+            self._queue = asyncio.Queue()
+            self._batcher = asyncio.get_running_loop().create_task(self._batch_loop())
+        future = asyncio.get_running_loop().create_future()
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        await self._queue.put((options, file, future))
+        return await future
+
+    async def _collect(self):
+        """等待第一个请求，再在max_delay内收集至多max_batch个，按参数分组"""
+        options, file, future = await self._queue.get()
+        batches = {options: [(file, future)]}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        for _ in range(self.max_batch - 1):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                options, file, future = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            batches.setdefault(options, []).append((file, future))
+        return batches
+
+    async def _batch_loop(self):
+        while True:
+            for (conf, to_str, display), items in (await self._collect()).items():
+                items = [(file, future) for file, future in items if not future.done()]
+                if not items:
+                    continue
+                try:
+                    results = await self._call(
+                        recognize_batch, self.model, [file for file, _ in items], conf, to_str, display, return_exceptions=True
+                    )
+                except Exception as e:
+                    results = [e] * len(items)
+                for (_, future), result in zip(items, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+
+    async def close(self):
+        """不再接受新请求；正在推理与排队中的请求以RuntimeError结束"""
+        self._closed = True
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+            self._batcher = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+        for future in list(self._futures):
+            if not future.done():
+                future.set_exception(RuntimeError('AsyncRecognizer is closed!'))
+        self.shutdown()
+
+    async def __aexit__(self, *exc):
+        await self.close()
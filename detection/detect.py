@@ -1,16 +1,24 @@
-from ultralytics import YOLO
 from sklearn.cluster import DBSCAN
-from pathlib import Path
+from PIL import Image, ImageDraw, ImageOps
+import numpy as np
+import io
+import math
 import streamlit as st
 
+from detection.pool import ModelPool, new_model
+from mahjong import aio
 from mahjong.checker import HONORS, BACK, AKA_MAN, AKA_PIN, AKA_SOU, AKA_DORA, NINES
 
 
 @st.cache_resource
 def load_model():
-    model_path = Path(__file__).resolve().parent / 'weights' / 'yolov8x.pt'
-    model = YOLO(model_path)
-    return model
+    return new_model()
+
+
+@st.cache_resource
+def load_pool(size=None, max_waiting=8, timeout=60):
+    """所有会话共用的模型池，见detection.pool.ModelPool"""
+    return ModelPool(size, max_waiting, timeout)
 
 
 IDS = {
@@ -23,8 +31,137 @@ IDS = {
 }
 
 
+"""模型输入边长（YOLOv8默认imgsz）"""
+MODEL_SIZE = 640
+
+
+def tiles_box(image, margin=0.08):
+    """
+    估计麻将牌所在的区域：在缩略图上找亮度高、饱和度低（牌面）的像素所在的行与列
+    :return: 原图坐标的(left, top, right, bottom)，无法估计或区域几乎为整张图片时返回None
+    """
+    small = image.copy()
+    small.thumbnail((128, 128))
+    hsv = np.asarray(small.convert('HSV'), dtype=np.int16)
+    mask = (hsv[..., 2] > 170) & (hsv[..., 1] < 60)
+    if mask.mean() < 0.01:
+        return None
+    rows = np.where(mask.mean(axis=1) > 0.05)[0]
+    cols = np.where(mask.mean(axis=0) > 0.05)[0]
+    if not len(rows) or not len(cols):
+        return None
+    h, w = mask.shape
+    top, bottom = rows[0] / h, (rows[-1] + 1) / h
+    left, right = cols[0] / w, (cols[-1] + 1) / w
+    top, left = max(0., top - margin), max(0., left - margin)
+    bottom, right = min(1., bottom + margin), min(1., right + margin)
+    if (bottom - top) * (right - left) > 0.85:
+        return None
+    width, height = image.size
+    return int(left * width), int(top * height), int(right * width), int(bottom * height)
+
+
+def _source(file, image):
+    """可重新读取的原图：路径或可seek的文件对象，无法重新读取时为None（须在解码前调用）"""
+    if not isinstance(file, Image.Image):
+        return file
+    if getattr(image, 'filename', None):
+        return image.filename
+    fp = getattr(image, 'fp', None)
+    return fp if fp is not None and fp.seekable() else None
+
+
+def _reopen(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return Image.open(source)
+
+
+def _decode(image, request=None):
+    """按EXIF方向旋转并转为RGB；request为(宽, 高)时JPEG按不小于它的1/2、1/4或1/8大小解码（draft）"""
+    if request is not None and image.format == 'JPEG':
+        image.draft('RGB', request)
+    return ImageOps.exif_transpose(image).convert('RGB')
+
+
+def _relative(box, size):
+    """像素坐标的区域 -> 相对坐标"""
+    if box is None:
+        return None
+    width, height = size
+    return box[0] / width, box[1] / height, box[2] / width, box[3] / height
+
+
+def _draft_request(image, box, size):
+    """尚未解码的图片中，使区域box（旋转后的相对坐标，None为整张图片）的长边不小于size的解码大小"""
+    width, height = image.size
+    rotated = (height, width) if image.getexif().get(0x0112, 1) in (5, 6, 7, 8) else (width, height)
+    left, top, right, bottom = box or (0., 0., 1., 1.)
+    scale = min(1., size / max((right - left) * rotated[0], (bottom - top) * rotated[1], 1))
+    return math.ceil(width * scale), math.ceil(height * scale)
+
+
+def _larger(size, previous):
+    """size是否比previous要求更高的分辨率（None为不缩小）"""
+    if previous is None:
+        return False
+    return size is None or size > previous
+
+
+def preprocess(file, size=MODEL_SIZE, crop=True):
+    """
+    推理前的预处理：JPEG按缩小的比例解码（draft），按EXIF方向旋转，裁剪到牌所在区域，缩小到模型输入大小。
+    裁剪时先在小比例解码的图上估计牌的区域，再按裁剪后长边不小于size的比例重新解码原图，
+    原图无法重新读取时按原大小解码
+    结果的info['preprocessed']中记录所用的size、crop、牌的区域与原图来源；再次预处理时，若要求的size比上次大，
+    则从原图重新读取并沿用上次估计的区域，原图无法重新读取（如传入已解码的图片）时按原样返回；否则直接返回（需要时缩小）
+    :param file: 图片路径、文件对象或尚未解码的PIL图片
+    :param size: 缩小后的长边，None为不缩小
+    :param crop: 是否裁剪到tiles_box估计的区域
+    :return: RGB的PIL图片
+    """
+    image = file if isinstance(file, Image.Image) else Image.open(file)
+    done = image.info.get('preprocessed')
+    if done:
+        source = done['source']
+        if _larger(size, done['size']) and source is not None:
+            if crop and done['crop']:
+                return _preprocess(_reopen(source), source, size, crop, done['box'], True)
+            return _preprocess(_reopen(source), source, size, crop)
+        if size is not None and max(image.size) > size:
+            image = image.copy()
+            image.thumbnail((size, size), Image.BILINEAR)
+        return image
+    return _preprocess(image, _source(file, image), size, crop)
+
+
+def _preprocess(image, source, size, crop, box=None, located=False):
+    """located为True时box为已估计的牌的区域（相对坐标，None为整张图片），不再重新估计"""
+    if crop and size is not None and image.format == 'JPEG' and source is not None:
+        if not located:
+            small = _decode(image, (256, 256))
+            box = _relative(tiles_box(small), small.size)
+            located = True
+            image = _reopen(source)
+        image = _decode(image, _draft_request(image, box, size))
+    else:
+        """裁剪而无法重新读取时按原大小解码，以免裁剪后小于size"""
+        image = _decode(image, None if size is None or crop else (size, size))
+    if crop:
+        if not located:
+            box = _relative(tiles_box(image), image.size)
+        if box is not None:
+            width, height = image.size
+            image = image.crop((int(box[0] * width), int(box[1] * height), int(box[2] * width), int(box[3] * height)))
+    if size is not None and max(image.size) > size:
+        image.thumbnail((size, size), Image.BILINEAR)
+    image.info['preprocessed'] = {'size': size, 'crop': crop, 'box': box if crop else None, 'source': source}
+    return image
+
+
 def vertical_cluster(boxes, eps):
-    y_coords = [[_.xyxy.tolist()[0][1]] for _ in boxes]
+    """boxes: 按y1排序的[x1, y1, x2, y2, 类别]"""
+    y_coords = [[_[1]] for _ in boxes]
     # print("boxes".center(50, '-'))
     # print(np.array(y_coords))
     db = DBSCAN(eps=eps, min_samples=1).fit(y_coords)
@@ -43,8 +180,9 @@ def vertical_cluster(boxes, eps):
 
 
 def horizontal_split(boxes):
-    x_coords = [_.xyxy.tolist()[0][0] for _ in boxes]
-    widths = [_.xywh.tolist()[0][2] for _ in boxes]
+    """boxes: 按x1排序的[x1, y1, x2, y2, 类别]"""
+    x_coords = [_[0] for _ in boxes]
+    widths = [_[2] - _[0] for _ in boxes]
     groups = [[boxes[0]]]
     for i in range(len(boxes) - 1):
         # print(x_coords[i + 1] - x_coords[i] - widths[i])
@@ -55,30 +193,183 @@ def horizontal_split(boxes):
     return groups
 
 
-def recognize(model, file, conf=0.5, to_str=True, display=True):
-    output = model.predict(source=file, conf=conf)[0]
+def slice_windows(width, height, slices=(2, 2), overlap=0.2):
+    """
+    把图片分成slices=(列数, 行数)块相互重叠的窗口，相邻窗口重叠窗口边长的overlap
+    :return: [(left, top, right, bottom)]
+    """
+    res = []
+    columns, rows = slices
+    w = width / (columns - (columns - 1) * overlap)
+    h = height / (rows - (rows - 1) * overlap)
+    for j in range(rows):
+        for i in range(columns):
+            left, top = i * w * (1 - overlap), j * h * (1 - overlap)
+            res.append((int(left), int(top), min(width, int(left + w + 0.5)), min(height, int(top + h + 0.5))))
+    return res
+
+
+def merge_boxes(xyxy, scores, threshold=0.6):
+    """
+    跨窗口的非极大值抑制：按置信度从高到低保留检测框，与已保留的框的交集超过较小一方面积的threshold时舍去
+    （窗口边缘被截断的牌的检测框较小，与完整的框IoU不高，故按较小的面积计算）
+    :return: 保留的检测框下标
+    """
+    xyxy = np.asarray(xyxy, dtype=float).reshape(-1, 4)
+    areas = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+    order = np.argsort(-np.asarray(scores))
+    keep = []
+    while len(order):
+        i, order = order[0], order[1:]
+        keep.append(i)
+        w = np.minimum(xyxy[i, 2], xyxy[order, 2]) - np.maximum(xyxy[i, 0], xyxy[order, 0])
+        h = np.minimum(xyxy[i, 3], xyxy[order, 3]) - np.maximum(xyxy[i, 1], xyxy[order, 1])
+        intersection = np.clip(w, 0, None) * np.clip(h, 0, None)
+        order = order[intersection <= threshold * np.minimum(areas[i], areas[order])]
+    return np.array(keep, dtype=int)
+
+
+def predict_sliced(model, image, conf=0.5, slices=(2, 2), overlap=0.2, batch_size=4, full=True, threshold=0.6):
+    """
+    分块推理：各窗口按batch_size张一批推理，检测框换算回整张图片后合并
+    :param image: PIL图片
+    :param full: 是否另外对整张图片推理（较大的牌在整图上更容易识别）
+    :param threshold: 见merge_boxes
+    :return: ((n, 4)检测框, (n,)类别)
+    """
+    windows = slice_windows(image.width, image.height, slices, overlap)
+    sources = [image.crop(window) for window in windows]
+    offsets = [window[:2] for window in windows]
+    if full:
+        sources.append(image)
+        offsets.append((0, 0))
+    xyxy, scores, classes = [], [], []
+    for start in range(0, len(sources), batch_size):
+        outputs = model.predict(source=sources[start:start + batch_size], conf=conf)
+        for output, (left, top) in zip(outputs, offsets[start:start + batch_size]):
+            boxes = output.boxes
+            xyxy.append(boxes.xyxy.cpu().numpy() + [left, top, left, top])
+            scores.append(boxes.conf.cpu().numpy())
+            classes.append(boxes.cls.cpu().numpy())
+    xyxy, scores, classes = np.concatenate(xyxy), np.concatenate(scores), np.concatenate(classes)
+    keep = merge_boxes(xyxy, scores, threshold)
+    return xyxy[keep], classes[keep]
+
+
+def recognize(model, file, conf=0.5, to_str=True, display=True, size=MODEL_SIZE, crop=True, slices=None, overlap=0.2, batch_size=4):
+    """
+    size、crop见preprocess
+    :param slices: 分块推理的(列数, 行数)，None为整张图片推理一次；分块时预处理后的长边为size乘以较大的块数
+    :param overlap, batch_size: 见predict_sliced
+    """
+    if slices is None:
+        output = model.predict(source=preprocess(file, size, crop), conf=conf)[0]
+        return group_output(output, to_str, display)
+    image = preprocess(file, None if size is None else size * max(slices), crop)
+    xyxy, classes = predict_sliced(model, image, conf, slices, overlap, batch_size)
+    groups = group_boxes(xyxy, classes, model.names if to_str else IDS)
+    if display:
+        return groups, Annotation(image, xyxy, classes)
+    return groups
+
+
+def recognize_batch(model, files, conf=0.5, to_str=True, display=False, size=MODEL_SIZE, crop=True, return_exceptions=False):
+    """
+    多张图片逐张预处理，一次推理，返回各图片的recognize结果
+    :param return_exceptions: 为True时单张图片预处理或分组出错不影响其他图片，其结果为该异常（同asyncio.gather）
+    """
+    res = []
+    images = []
+    for file in files:
+        try:
+            images.append(preprocess(file, size, crop))
+            res.append(None)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            res.append(e)
+    outputs = iter(model.predict(source=images, conf=conf) if images else ())
+    for i, item in enumerate(res):
+        if item is not None:
+            continue
+        try:
+            res[i] = group_output(next(outputs), to_str, display)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            res[i] = e
+    return res
+
+
+class Annotation:
+    """检测结果的标注图：只保存原图与检测框，render时才按显示大小绘制"""
+
+    def __init__(self, image, xyxy, classes):
+        """
+        :param image: RGB的ndarray或PIL图片
+        :param xyxy: (n, 4)检测框
+        :param classes: (n,)模型类别
+        """
+        self.image = image
+        self.xyxy = np.asarray(xyxy, dtype=float).reshape(-1, 4)
+        self.classes = np.asarray(classes, dtype=int).reshape(-1)
+
+    @classmethod
+    def from_output(cls, output):
+        """output.orig_img为BGR，转为RGB视图（不复制）"""
+        boxes = output.boxes
+        return cls(output.orig_img[:, :, ::-1], boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy())
+
+    def render(self, width=480, format='JPEG', quality=80):
+        """
+        :param width: 输出宽度（像素），不放大
+        :param format: 'JPEG'或'WEBP'
+        :return: 压缩后的图片bytes
+        """
+        image = self.image if isinstance(self.image, Image.Image) else Image.fromarray(np.ascontiguousarray(self.image))
+        scale = min(1., width / image.width)
+        image = image.convert('RGB').resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.BILINEAR)
+        draw = ImageDraw.Draw(image)
+        for (x1, y1, x2, y2), c in zip(self.xyxy * scale, self.classes):
+            draw.rectangle((x1, y1, x2, y2), outline=(255, 64, 64), width=1)
+            draw.text((x1 + 1, y1 + 1), _id2str([IDS[c]]), fill=(255, 64, 64))
+        buffer = io.BytesIO()
+        image.save(buffer, format=format, quality=quality)
+        return buffer.getvalue()
+
+
+def group_output(output, to_str=True, display=True):
+    """
+    把一张图片的推理结果按行、按间隔分组
+    :param display: 为True时另外返回Annotation（调用其render才绘制标注图）
+    """
     boxes = output.boxes
-    res_plotted = None
+    groups = group_boxes(boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy(), output.names if to_str else IDS)
     if display:
-        res_plotted = output.plot()[:, :, ::-1]
-    h = sum([_.xywh.tolist()[0][3] for _ in boxes]) / len(boxes)
+        return groups, Annotation.from_output(output)
+    else:
+        return groups
+
 
-    boxes = list(sorted(boxes, key=lambda _: _.xyxy.tolist()[0][1]))
+def group_boxes(xyxy, classes, names=IDS):
+    """
+    检测框 -> 各行中相连的牌
+    :param xyxy: (n, 4)检测框
+    :param classes: (n,)模型类别
+    :param names: 类别 -> 结果，默认为牌id
+    """
+    boxes = [[*box, c] for box, c in zip(np.asarray(xyxy, dtype=float).tolist(), np.asarray(classes).tolist())]
+    h = sum([_[3] - _[1] for _ in boxes]) / len(boxes)
+
+    boxes = list(sorted(boxes, key=lambda _: _[1]))
     groups = vertical_cluster(boxes, 0.5 * h)
 
     lines = []
     for group in groups:
-        group = list(sorted(group, key=lambda _: _.xyxy.tolist()[0][0]))
+        group = list(sorted(group, key=lambda _: _[0]))
         line = horizontal_split(group)
         lines.append(line)
-    if to_str:
-        m = output.names
-    else:
-        m = IDS
-    if display:
-        return [[[m[_.cls.int().item()] for _ in items] for items in line] for line in lines], res_plotted
-    else:
-        return [[[m[_.cls.int().item()] for _ in items] for items in line] for line in lines]
+    return [[[names[int(_[4])] for _ in items] for items in line] for line in lines]
 
 
 def _id2str(id_list):
@@ -144,3 +435,96 @@ def to_string(id_groups):
         s.append(id2str(tiles, concealed_kong=True))
     hu_tile = id2str([hu_tile])
     return ' '.join(s), hu_tile
+
+
+"""俯拍牌桌时四家的位置，按逆时针（出牌顺序）排列；bottom为靠近镜头的一家"""
+SIDES = ('bottom', 'right', 'top', 'left')
+
+"""各家视角下的坐标: 牌从左到右为x增大，靠近该家的方向为y增大"""
+_SIDE_TRANSFORMS = {
+    'bottom': lambda x, y: (x, y),
+    'right': lambda x, y: (-y, x),
+    'top': lambda x, y: (-x, -y),
+    'left': lambda x, y: (y, -x)
+}
+
+
+def split_players(xyxy, width, height):
+    """
+    按检测框相对所有框中心的位置，把俯拍牌桌的检测框分给四家，并转换到各家视角
+    :param xyxy: (n, 4)检测框
+    :param width, height: 图片大小，用于把横、纵方向的距离统一比较
+    :return: {方位: ((k,)检测框下标, (k, 4)该家视角下的检测框)}，没有牌的一家不在结果中
+    """
+    xyxy = np.asarray(xyxy, dtype=float).reshape(-1, 4)
+    cx = (xyxy[:, 0] + xyxy[:, 2]) / 2
+    cy = (xyxy[:, 1] + xyxy[:, 3]) / 2
+    dx = (cx - np.median(cx)) / width
+    dy = (cy - np.median(cy)) / height
+    sides = np.where(
+        np.abs(dy) >= np.abs(dx),
+        np.where(dy >= 0, 0, 2),
+        np.where(dx >= 0, 1, 3)
+    )
+    res = {}
+    for i, side in enumerate(SIDES):
+        index = np.where(sides == i)[0]
+        if not len(index):
+            continue
+        x1, y1 = _SIDE_TRANSFORMS[side](xyxy[index, 0], xyxy[index, 1])
+        x2, y2 = _SIDE_TRANSFORMS[side](xyxy[index, 2], xyxy[index, 3])
+        boxes = np.stack([np.minimum(x1, x2), np.minimum(y1, y2), np.maximum(x1, x2), np.maximum(y1, y2)], axis=1)
+        res[side] = index, boxes
+    return res
+
+
+def recognize_table(model, file, conf=0.5, to_str=False, size=MODEL_SIZE, crop=False, slices=None, overlap=0.2, batch_size=4):
+    """
+    一张俯拍牌桌照片中四家的手牌，一次推理（或一次分块推理，参数同recognize）
+    :return: {方位: 同recognize的分组}
+    """
+    if slices is None:
+        image = preprocess(file, size, crop)
+        boxes = model.predict(source=image, conf=conf)[0].boxes
+        xyxy, classes = boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy()
+    else:
+        image = preprocess(file, None if size is None else size * max(slices), crop)
+        xyxy, classes = predict_sliced(model, image, conf, slices, overlap, batch_size)
+    names = model.names if to_str else IDS
+    width, height = image.size
+    return {
+        side: group_boxes(boxes, classes[index], names)
+        for side, (index, boxes) in split_players(xyxy, width, height).items()
+    }
+
+
+def score_table(model, file, prevailing_wind, bottom_wind, conf=0.5, executor=None, size=MODEL_SIZE, crop=False, slices=None, overlap=0.2, batch_size=4, **context):
+    """
+    识别并计算俯拍牌桌照片中四家的手牌（各家的最后一张手牌视为和了牌）
+    :param bottom_wind: 靠近镜头一家的自风，其余各家按逆时针依次为下一个风
+    :param slices, overlap, batch_size: 分块推理的参数，见recognize
+    :param executor: concurrent.futures执行器（如ProcessPoolExecutor），各家并行计算；None时在当前进程中依次计算
+    :param context: update的其余参数（is_self_draw、lichi、dora、ura_dora等），四家相同
+    :return: {方位: {'tiles', 'hu_tile', 'result'或'error'}}
+    """
+    res = {}
+    jobs = {}
+    for side, groups in recognize_table(model, file, conf, False, size, crop, slices, overlap, batch_size).items():
+        try:
+            tiles, hu_tile = to_string(groups)
+        except Exception as e:
+            res[side] = {'error': e}
+            continue
+        res[side] = {'tiles': tiles, 'hu_tile': hu_tile}
+        jobs[side] = tiles, hu_tile, {
+            **context, 'prevailing_wind': prevailing_wind, 'dealer_wind': (bottom_wind - 1 + SIDES.index(side)) % 4 + 1
+        }
+    futures = {} if executor is None else {
+        side: executor.submit(aio.score, tiles, hu_tile, **kwargs) for side, (tiles, hu_tile, kwargs) in jobs.items()
+    }
+    for side, (tiles, hu_tile, kwargs) in jobs.items():
+        try:
+            res[side]['result'] = futures[side].result() if futures else aio.score(tiles, hu_tile, **kwargs)
+        except Exception as e:
+            res[side]['error'] = e
+    return res
@@ -0,0 +1,131 @@
+"""
+线程安全的YOLO模型池（不依赖streamlit）
+
+池中预先加载size个模型实例，加载后各推理一次空白图片完成预热；每个实例同一时间只借给一个线程，
+用完归还。没有空闲实例时请求排队等待，排队数达到max_waiting时立即拒绝（queue.Full），
+等待超过timeout时抛出TimeoutError，由调用方决定重试或提示繁忙。
+stats返回排队数、使用中的实例数与等待时间等统计。
+用法:
+    pool = ModelPool(size=2, max_waiting=8, timeout=30)
+    with pool.acquire() as model:
+        groups = recognize(model, image, display=False)
+    outputs = pool.predict(source=images, conf=0.5)
+    pool.stats()
+"""
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from ultralytics import YOLO
+
+MODEL_PATH = Path(__file__).resolve().parent / 'weights' / 'yolov8x.pt'
+
+"""预热图片边长，同detection.detect.MODEL_SIZE"""
+WARMUP_SIZE = 640
+
+
+def new_model(path=MODEL_PATH):
+    return YOLO(path)
+
+
+def default_size():
+    """YOLO在CPU上单次推理已使用多个线程，默认每两个核一个实例"""
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+class ModelPool:
+
+    def __init__(self, size=None, max_waiting=None, timeout=None, factory=new_model, warmup=True):
+        """
+        :param size: 模型实例数，None为default_size()
+        :param max_waiting: 排队等待的请求数上限，None为不限
+        :param timeout: 默认等待超时（秒），None为不限
+        :param factory: 无参数，返回一个新模型实例
+        :param warmup: 加载后是否预热
+        """
+        self.size = default_size() if size is None else size
+        if self.size < 1:
+            raise ValueError(f'Wrong pool size: {self.size}!')
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._served = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._wait_total = 0.
+        self._wait_max = 0.
+        self._wait_last = 0.
+        self.models = [factory() for _ in range(self.size)]
+        for model in self.models:
+            if warmup:
+                self.warmup(model)
+            self._idle.put(model)
+
+    @staticmethod
+    def warmup(model, size=WARMUP_SIZE):
+        """首次predict时才初始化推理器与融合网络层，加载时先用空白图片推理一次"""
+        model.predict(source=np.zeros((size, size, 3), dtype=np.uint8), verbose=False)
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        """
+        借出一个模型实例，退出with时归还
+        :param timeout: 本次等待的超时（秒），默认为self.timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            if self.max_waiting is not None and self._waiting >= self.max_waiting and self._idle.empty():
+                self._rejected += 1
+                raise queue.Full('Model pool is busy!')
+            self._waiting += 1
+        start = time.perf_counter()
+        try:
+            model = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timed_out += 1
+            raise TimeoutError('Timed out waiting for a model!') from None
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        wait = time.perf_counter() - start
+        with self._lock:
+            self._served += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._wait_last = wait
+        try:
+            yield model
+        finally:
+            self._idle.put(model)
+
+    def predict(self, *args, timeout=None, **kwargs):
+        """借出一个实例调用model.predict(*args, **kwargs)"""
+        with self.acquire(timeout) as model:
+            return model.predict(*args, **kwargs)
+
+    def stats(self):
+        """
+        :return: size、idle（空闲实例数）、in_use（使用中的实例数）、waiting（排队数）、served（已借出次数）、
+        rejected（因排队已满被拒绝数）、timed_out（等待超时数）、wait_mean/wait_max/wait_last（等待时间，秒）
+        """
+        with self._lock:
+            idle = self._idle.qsize()
+            return {
+                'size': self.size,
+                'idle': idle,
+                'in_use': self.size - idle,
+                'waiting': self._waiting,
+                'served': self._served,
+                'rejected': self._rejected,
+                'timed_out': self._timed_out,
+                'wait_mean': self._wait_total / self._served if self._served else 0.,
+                'wait_max': self._wait_max,
+                'wait_last': self._wait_last
+            }
@@ -0,0 +1,145 @@
+"""
+asyncio接口：把计分、听牌计算放到线程池或进程池中执行，不阻塞事件循环
+
+AsyncRunner限制同时执行的调用数，支持超时（asyncio.TimeoutError）与取消：
+尚未开始执行的调用被取消后不再执行，已开始的调用在执行器中完成后丢弃结果，完成前仍占用并发名额，
+因此连续超时也不会使执行器中积压超过max_concurrency个调用。
+用法:
+    scorer = AsyncScorer(kind='process', workers=4, max_concurrency=64, timeout=5)
+    result = await scorer.score('123m456p789s1122z', '2z', prevailing_wind=1, dealer_wind=2, is_self_draw=False, lichi=1, dora='1z', ura_dora='')
+    waits = await scorer.ready_hand('1112345678999m')
+    scorer.shutdown()
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+
+from mahjong.checker import Mahjong
+from mahjong.score import ScoreCalculator
+
+"""ScoreCalculator保存每次计算的状态，每个线程（进程）使用各自的实例"""
+_local = threading.local()
+
+
+def _calculator():
+    if not hasattr(_local, 'calculator'):
+        _local.calculator = ScoreCalculator()
+        _local.checker = Mahjong()
+    return _local.calculator
+
+
+def score(tiles, hu_tile, **kwargs):
+    """update并返回结果摘要（可pickle）"""
+    calculator = _calculator()
+    calculator.update(tiles, hu_tile, **kwargs)
+    return calculator._result(kwargs['dealer_wind'] == 1, kwargs['is_self_draw'])
+
+
+def ready_hand(tiles, to_unicode=False, engine='dfs'):
+    _calculator()
+    return _local.checker.calculate_ready_hand(tiles, to_unicode, engine)
+
+
+class AsyncRunner:
+
+    def __init__(self, executor=None, kind='thread', workers=None, max_concurrency=None, timeout=None):
+        """
+        :param executor: 使用已有的concurrent.futures执行器，此时忽略kind与workers，shutdown不关闭它
+        :param kind: 'thread'或'process'
+        :param workers: 执行器的线程（进程）数，None为默认值
+        :param max_concurrency: 同时提交给执行器的调用数上限，其余调用在事件循环中等待，None为不限
+        :param timeout: 默认超时（秒），None为不限
+        """
+        self._own_executor = executor is None
+        if executor is None:
+            if kind == 'thread':
+                executor = ThreadPoolExecutor(workers)
+            elif kind == 'process':
+                executor = ProcessPoolExecutor(workers)
+            else:
+                raise ValueError(f'Unknown executor kind: {kind}!')
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._semaphore = None
+
+    def _get_semaphore(self):
+        """在首次调用时创建，使信号量属于运行中的事件循环"""
+        if self._semaphore is None and self.max_concurrency is not None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def run(self, func, *args, timeout=None, **kwargs):
+        """
+        在执行器中调用func(*args, **kwargs)，进程池时func与参数须可pickle
+        :param timeout: 本次调用的超时（秒），包括排队等待的时间，默认为self.timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        return await asyncio.wait_for(self._call_bounded(func, *args, **kwargs), timeout)
+
+    async def _call_bounded(self, func, *args, **kwargs):
+        """
+        占用一个并发名额在执行器中调用func，名额由执行器中任务的done回调释放:
+        等待方超时或被取消时，尚未开始的任务随之取消并立即释放名额，已开始的任务执行完毕后才释放
+        """
+        semaphore = self._get_semaphore()
+        if semaphore is None:
+            return await self._call(func, *args, **kwargs)
+        await semaphore.acquire()
+        try:
+            future = self.executor.submit(func, *args, **kwargs)
+        except BaseException:
+            semaphore.release()
+            raise
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda _: self._release(loop, semaphore))
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def _release(loop, semaphore):
+        """在执行器线程中回调，转到事件循环中释放；事件循环已关闭时不再需要释放"""
+        try:
+            loop.call_soon_threadsafe(semaphore.release)
+        except RuntimeError:
+            pass
+
+    async def _bounded(self, coroutine_func, *args, **kwargs):
+        """在并发上限内await coroutine_func(*args, **kwargs)，coroutine_func结束或被取消时即释放名额"""
+        semaphore = self._get_semaphore()
+        if semaphore is None:
+            return await coroutine_func(*args, **kwargs)
+        async with semaphore:
+            return await coroutine_func(*args, **kwargs)
+
+    def shutdown(self, wait=True):
+        if self._own_executor:
+            self.executor.shutdown(wait=wait, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.shutdown()
+
+
+class AsyncScorer(AsyncRunner):
+
+    async def score(self, tiles, hu_tile, timeout=None, **kwargs):
+        """参数同ScoreCalculator.update，返回结果摘要（见ScoreCalculator._result）"""
+        return await self.run(score, tiles, hu_tile, timeout=timeout, **kwargs)
+
+    async def score_many(self, hands, timeout=None):
+        """
+        :param hands: 可迭代的(tiles, hu_tile, {update的其余参数})
+        :return: 按输入顺序的结果摘要
+        """
+        return await asyncio.gather(*(self.score(tiles, hu_tile, timeout=timeout, **kwargs) for tiles, hu_tile, kwargs in hands))
+
+    async def ready_hand(self, tiles, to_unicode=False, engine='dfs', timeout=None):
+        """同Mahjong.calculate_ready_hand"""
+        return await self.run(ready_hand, tiles, to_unicode, engine, timeout=timeout)
@@ -0,0 +1,60 @@
+"""
+拆分、听牌引擎的性能对比
+python -m mahjong.benchmark
+"""
+import time
+import random
+
+from mahjong.checker import Mahjong, _split_counts
+
+"""清一色和了型（多面听、多种拆法）"""
+CHINITSU_HANDS = [
+    '11122233344455m',
+    '11112222333345m',
+    '22223333444456p',
+    '11123455567899s',
+    '12223334445556m',
+    '23344455566678p',
+    '11223344556677s',
+    '11112345678999m',
+]
+
+
+def random_chinitsu_hands(number, seed=0):
+    """随机的14张清一色手牌（大多不是和了型）"""
+    rng = random.Random(seed)
+    hands = []
+    for _ in range(number):
+        suit = rng.choice('mps')
+        digits = sorted(rng.sample([str(i) for i in range(1, 10) for _ in range(4)], 14))
+        hands.append(''.join(digits) + suit)
+    return hands
+
+
+def _timeit(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_search_combinations(hands, repeat=3):
+    """比较search_combinations各引擎在每手牌上的平均耗时（秒）"""
+    checker = Mahjong()
+    tiles = [sorted(checker.str2id(_)[0]) for _ in hands]
+    res = {}
+    for engine in ['dfs', 'memo']:
+        res[engine] = _timeit(lambda: [checker.search_combinations(t, 0, engine=engine) for t in tiles], repeat) / len(tiles)
+
+    def cold():
+        _split_counts.cache_clear()
+        for t in tiles:
+            checker.search_combinations(t, 0, engine='memo')
+    res['memo (cold cache)'] = _timeit(cold, repeat) / len(tiles)
+    return res
+
+
+if __name__ == '__main__':
+    for name, hands in [('chinitsu', CHINITSU_HANDS), ('random chinitsu', random_chinitsu_hands(200))]:
+        result = bench_search_combinations(hands)
+        print(name, ', '.join(f'{engine}: {t * 1e6:.1f}us' for engine, t in result.items()))
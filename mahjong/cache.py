@@ -0,0 +1,205 @@
+"""
+ScoreCalculator结果的持久化缓存（SQLite）
+
+键为规范化后的输入（手牌、副露、和了牌、宝牌排序后重写，参数补全默认值）的哈希，
+并按规则版本（计分相关源码的哈希，或自行指定）分开保存：规则或实现改动后旧结果不再命中，可由compact清除。
+批量重算中断后重新运行时，已计算的手牌直接命中缓存，相当于从中断处继续。
+用法:
+    with ResultCache('audit.sqlite') as cache:
+        for result in cache.score_many(hands):
+            ...
+        print(cache.stats())
+"""
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import time
+from functools import lru_cache
+
+from mahjong import checker, score
+from mahjong.checker import Mahjong
+from mahjong.score import ScoreCalculator
+
+"""update中取值为真假的参数（规范化为bool）"""
+FLAG_PARAMS = {
+    'is_self_draw', 'ippatsu', 'is_under_the_sea', 'is_after_a_kong', 'is_robbing_the_kong', 'is_blessing_of_heaven',
+    'is_blessing_of_earth', 'use_ancient_yaku', 'is_blessing_of_man', 'tsubamegaeshi', 'kanfuri', 'double_yakuman'
+}
+
+
+@lru_cache(maxsize=None)
+def ruleset_hash():
+    """由计分相关源码计算的规则版本"""
+    h = hashlib.sha1()
+    for module in (checker, score):
+        h.update(inspect.getsource(module).encode())
+    return h.hexdigest()[:16]
+
+
+class ResultCache:
+
+    def __init__(self, path, max_entries=1000000, commit_every=100, ruleset=None, touch_interval=3600):
+        """
+        :param path: SQLite文件路径
+        :param max_entries: 条目数上限，超出时按最近使用时间淘汰最旧的约10%
+        :param commit_every: 每写入多少次提交一次（中断时至多损失这么多条结果）
+        :param ruleset: 规则版本，默认为ruleset_hash()
+        :param touch_interval: 命中时只刷新最近使用时间早于此秒数的条目，并在commit时批量写入
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+        self.touch_interval = touch_interval
+        self.ruleset = ruleset or ruleset_hash()
+        self.checker = Mahjong()
+        self.calculator = ScoreCalculator()
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+        self._touched = []
+        self._signature = inspect.signature(ScoreCalculator.update)
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'ruleset TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, last_used REAL NOT NULL, '
+            'PRIMARY KEY (ruleset, key))'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        self._db.commit()
+        self._entries = self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def _canonical_tiles(self, tiles: str):
+        hand_tiles, called_tiles = self.checker.str2id(tiles)
+        called = sorted(self.checker.id2str(sorted(_)) for _ in called_tiles)
+        return ' '.join([self.checker.id2str(sorted(hand_tiles)), *called])
+
+    def params(self, *args, **kwargs):
+        """按update的参数表补全默认值并规范化，返回dict"""
+        bound = self._signature.bind(None, *args, **kwargs)
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+        params.pop('self')
+        return params
+
+    def key(self, *args, **kwargs):
+        """与update参数相同，返回缓存键"""
+        params = self.params(*args, **kwargs)
+        for name in ['tiles', 'hu_tile', 'dora', 'ura_dora']:
+            params[name] = self._canonical_tiles(params[name])
+        for name in FLAG_PARAMS:
+            params[name] = bool(params[name])
+        text = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def get(self, key):
+        row = self._db.execute(
+            'SELECT value, last_used FROM results WHERE ruleset = ? AND key = ?', (self.ruleset, key)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        now = time.time()
+        if now - row[1] >= self.touch_interval:
+            """只读的重跑不逐条写库，刷新时间在commit时一并写入"""
+            self._touched.append((now, self.ruleset, key))
+            if len(self._touched) >= self.commit_every:
+                self.commit()
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        params = (json.dumps(value, ensure_ascii=False, default=int), time.time(), self.ruleset, key)
+        cursor = self._db.execute('UPDATE results SET value = ?, last_used = ? WHERE ruleset = ? AND key = ?', params)
+        if cursor.rowcount == 0:
+            self._db.execute('INSERT INTO results (value, last_used, ruleset, key) VALUES (?, ?, ?, ?)', params)
+            self._entries += 1
+        if self._entries > self.max_entries:
+            self.evict(self.max_entries * 9 // 10)
+        self._written()
+
+    def _written(self):
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        if self._touched:
+            self._db.executemany('UPDATE results SET last_used = ? WHERE ruleset = ? AND key = ?', self._touched)
+            self._touched = []
+        self._db.commit()
+        self._pending = 0
+
+    def score(self, *args, **kwargs):
+        """
+        与update参数相同，返回ScoreCalculator结果的摘要（同tenpai_value的结果），优先取缓存
+        """
+        key = self.key(*args, **kwargs)
+        value = self.get(key)
+        if value is None:
+            params = self.params(*args, **kwargs)
+            self.calculator.update(**params)
+            value = self.calculator._result(params['dealer_wind'] == 1, params['is_self_draw'])
+            self.put(key, value)
+        return value
+
+    def score_many(self, hands):
+        """
+        :param hands: 可迭代的(tiles, hu_tile, {update的其余参数})
+        :return: 依次生成各手牌的结果
+        """
+        try:
+            for tiles, hu_tile, kwargs in hands:
+                yield self.score(tiles, hu_tile, **kwargs)
+        finally:
+            self.commit()
+
+    def evict(self, entries):
+        """按最近使用时间淘汰，只保留entries条"""
+        self._db.execute(
+            'DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+            (entries,)
+        )
+        self._entries = self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def compact(self):
+        """删除其他规则版本的结果，淘汰超出上限的条目并整理文件"""
+        self._db.execute('DELETE FROM results WHERE ruleset != ?', (self.ruleset,))
+        self.evict(self.max_entries)
+        self.commit()
+        self._db.execute('VACUUM')
+
+    def stats(self):
+        """命中率等统计"""
+        lookups = self.hits + self.misses
+        current = self._db.execute('SELECT COUNT(*) FROM results WHERE ruleset = ?', (self.ruleset,)).fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.,
+            'entries': self._entries,
+            'stale_entries': self._entries - current,
+            'file_size': os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(), 'results.sqlite')
+    hands = [('123m456p789s1122z', '2z', {'prevailing_wind': 1, 'dealer_wind': 2, 'is_self_draw': 0, 'lichi': 1, 'dora': '1z', 'ura_dora': ''})] * 3
+    with ResultCache(path) as cache:
+        for result in cache.score_many(hands):
+            print(result)
+        print(cache.stats())
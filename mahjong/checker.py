@@ -1,4 +1,6 @@
 import re
+from functools import lru_cache
+from itertools import groupby, permutations, product
 from typing import List, Iterable
 from copy import deepcopy, copy
 from collections import Counter
@@ -20,6 +22,37 @@ HONORS = {*WINDS, *DRAGONS}
 TERMINALS_HONORS = {*TERMINALS, *HONORS}
 GREENS = {21, 22, 23, 25, 27, 80}
 ALL = {*MANS, *PINS, *SOUS, *HONORS}
+TILE_IDS = sorted(ALL)
+TILE_INDEX = {tile: i for i, tile in enumerate(TILE_IDS)}
+
+"""34位占位掩码: 第i位表示TILE_IDS[i]是否出现"""
+TILE_BITS = {tile: 1 << i for i, tile in enumerate(TILE_IDS)}
+
+
+def tiles_mask(tiles: Iterable[int]):
+    mask = 0
+    for tile in tiles:
+        mask |= TILE_BITS[tile]
+    return mask
+
+
+MANS_MASK = tiles_mask(MANS)
+PINS_MASK = tiles_mask(PINS)
+SOUS_MASK = tiles_mask(SOUS)
+TERMINALS_MASK = tiles_mask(TERMINALS)
+WINDS_MASK = tiles_mask(WINDS)
+DRAGONS_MASK = tiles_mask(DRAGONS)
+HONORS_MASK = tiles_mask(HONORS)
+TERMINALS_HONORS_MASK = tiles_mask(TERMINALS_HONORS)
+GREENS_MASK = tiles_mask(GREENS)
+ALL_MASK = tiles_mask(ALL)
+
+"""宝牌指示牌 -> 宝牌"""
+DORA_NEXT = {
+    **{tile: tile - 8 if tile in NINES else tile + 1 for tile in (*MANS, *PINS, *SOUS)},
+    **{tile: (tile // 10 - 2) % 4 * 10 + 30 for tile in WINDS},
+    **{tile: (tile // 10 - 6) % 3 * 10 + 70 for tile in DRAGONS}
+}
 
 CHARACTERS_UNICODE = "🀇🀈🀉🀊🀋🀌🀍🀎🀏"
 DOTS_UNICODE = "🀙🀚🀛🀜🀝🀞🀟🀠🀡"
@@ -35,6 +68,141 @@ ID2UNICODE = {
 }
 
 
+def _suit_of(tile):
+    return tile // 10 if tile not in HONORS else None
+
+
+def suit_permutation(hand_tiles: Iterable[int], called_tiles: Iterable[Iterable[int]] = ()):
+    """
+    万、饼、索在拆分、听牌、向听数上完全对称（只有绿一色等少数役种区分花色），
+    按各花色的（手牌张数, 副露）从大到小排列得到规范形式
+    :return: perm，规范形式中第k种花色对应原来的第perm[k]种花色
+    """
+    keys = [[[0] * 10, []] for _ in range(3)]
+    for tile in hand_tiles:
+        if _suit_of(tile) is not None:
+            keys[_suit_of(tile)][0][tile % 10] += 1
+    for meld in called_tiles:
+        if _suit_of(meld[0]) is not None:
+            keys[_suit_of(meld[0])][1].append(tuple(tile % 10 for tile in meld))
+    keys = [(counts, sorted(melds)) for counts, melds in keys]
+    return tuple(sorted(range(3), key=lambda x: keys[x], reverse=True))
+
+
+def permute_tiles(tiles: Iterable[int], perm):
+    """原手牌 -> 规范形式"""
+    inverse = {suit: k for k, suit in enumerate(perm)}
+    return [tile if tile in HONORS else 10 * inverse[tile // 10] + tile % 10 for tile in tiles]
+
+
+def restore_tiles(tiles: Iterable[int], perm):
+    """规范形式 -> 原手牌"""
+    return [tile if tile in HONORS else 10 * perm[tile // 10] + tile % 10 for tile in tiles]
+
+
+def canonicalize(hand_tiles: List[int], called_tiles: List[List[int]] = ()):
+    """
+    :return: (规范形式的手牌, 规范形式的副露, perm)，结果用restore_tiles(..., perm)还原
+    """
+    perm = suit_permutation(hand_tiles, called_tiles)
+    return permute_tiles(hand_tiles, perm), [permute_tiles(_, perm) for _ in called_tiles], perm
+
+
+def _canonical_counts(counts: tuple):
+    """张数向量（按TILE_IDS的下标）的规范形式，返回(规范张数向量, perm)"""
+    suits = [counts[9 * k: 9 * k + 9] for k in range(3)]
+    perm = tuple(sorted(range(3), key=lambda x: suits[x], reverse=True))
+    return sum((suits[k] for k in perm), ()) + counts[27:], perm
+
+
+@lru_cache(maxsize=1 << 16)
+def _split_counts(counts: tuple, need_pair: bool):
+    """
+    将张数向量（按TILE_IDS的下标）拆为面子（need_pair时另加一个雀头），每种拆法只生成一次:
+    最左边的牌依次决定雀头(0或1个)、刻子(0或1个)，其余张数必须作为以它开头的顺子。
+    以剩余张数向量为键记忆化，不同拆分路径共用同一后缀的结果
+    :return: 拆分的元组，每个拆分为按(下标)非降序排列的面子元组，面子以牌的下标表示
+    """
+    i = next((i for i, n in enumerate(counts) if n), None)
+    if i is None:
+        return () if need_pair else ((),)
+    res = []
+    n = counts[i]
+    can_seq = i < 27 and i % 9 <= 6
+    for pair in ((0, 1) if need_pair else (0,)):
+        for triplet in (0, 1):
+            seqs = n - 2 * pair - 3 * triplet
+            if seqs < 0 or seqs and not (can_seq and counts[i + 1] >= seqs and counts[i + 2] >= seqs):
+                continue
+            left = list(counts)
+            left[i] = 0
+            if seqs:
+                left[i + 1] -= seqs
+                left[i + 2] -= seqs
+            head = ((i, i),) * pair + ((i, i, i),) * triplet + ((i, i + 1, i + 2),) * seqs
+            for tail in _split_counts(tuple(left), need_pair and not pair):
+                res.append(head + tail)
+    return tuple(res)
+
+
+"""面子（雀头）种类"""
+PAIR = 0
+SEQUENCE = 1
+TRIPLET = 2
+KONG = 3
+
+
+class Meld:
+    """
+    预先计算了种类等属性的面子（雀头），只读，由to_meld创建并缓存
+    tiles: 牌的tuple（暗杠为5张）
+    kind: PAIR / SEQUENCE / TRIPLET / KONG
+    suit: 0万 1饼 2索，字牌为None
+    first, last: 首、尾张
+    is_outside: 首或尾张为幺九牌、字牌
+    is_terminal: 首或尾张为幺九牌
+    is_called: 是否为副露（含暗杠）
+    is_concealed: 是否门清（手牌中的面子与暗杠）
+    has_hu: 是否含和了牌
+    is_two_sided: 是否为两面听的顺子
+    """
+    __slots__ = (
+        'tiles', 'kind', 'suit', 'first', 'last', 'is_outside', 'is_terminal', 'is_called', 'is_concealed', 'has_hu',
+        'is_two_sided'
+    )
+
+    def __init__(self, tiles: tuple, hu_tile=None, is_called=False):
+        self.tiles = tiles
+        self.first = first = tiles[0]
+        self.last = last = tiles[-1]
+        if len(tiles) == 2:
+            self.kind = PAIR
+        elif len(tiles) >= 4:
+            self.kind = KONG
+        elif first == last:
+            self.kind = TRIPLET
+        else:
+            self.kind = SEQUENCE
+        self.suit = _suit_of(first)
+        self.is_outside = first in TERMINALS_HONORS or last in TERMINALS_HONORS
+        self.is_terminal = first in TERMINALS or last in TERMINALS
+        self.is_called = is_called
+        self.is_concealed = not is_called or len(tiles) == 5
+        self.has_hu = not is_called and hu_tile in tiles
+        self.is_two_sided = self.kind == SEQUENCE and self.has_hu and (
+            (hu_tile == first and last not in NINES) or (hu_tile == last and first not in ONES)
+        )
+
+    def __repr__(self):
+        return f'Meld{self.tiles}'
+
+
+@lru_cache(maxsize=1 << 12)
+def to_meld(tiles: tuple, hu_tile=None, is_called=False):
+    """tiles须为已排序、赤宝牌已还原的tuple"""
+    return Meld(tiles, hu_tile, is_called)
+
+
 class Mahjong:
 
     def _str2id(self, tiles: str):
@@ -81,6 +249,27 @@ class Mahjong:
             called_tiles[i] = self._str2id(called)
         return hand_tiles, called_tiles
 
+    def id2str(self, ids: Iterable[int]):
+        """str2id的逆运算（仅手牌部分），赤宝牌写作0"""
+        m = p = s = z = ''
+        for tile in ids:
+            if tile in AKA_DORA:
+                digit = '0'
+            elif tile in HONORS:
+                digit = str(tile // 10 - 2)
+            else:
+                digit = str(tile % 10 + 1)
+            if tile in HONORS:
+                z += digit
+            elif tile < 9:
+                m += digit
+            elif tile < 19:
+                p += digit
+            else:
+                s += digit
+        sort_key = lambda x: '5' if x == '0' else x
+        return ''.join(''.join(sorted(digits, key=sort_key)) + suit for digits, suit in zip([m, p, s, z], 'mpsz') if digits)
+
     def _id2unicode(self, ids: Iterable[int]):
         return ''.join(map(ID2UNICODE.get, ids))
 
@@ -141,7 +330,14 @@ class Mahjong:
                 return False
         return True
 
-    def search_combinations(self, tiles: List[int], called_count):
+    def search_combinations(self, tiles: List[int], called_count, engine='dfs'):
+        """
+        :param engine: 'dfs'为逐个面子的深度优先搜索；'memo'按张数向量以规范顺序拆分并记忆化，结果与'dfs'相同
+        """
+        if engine == 'memo':
+            return self._search_combinations_memo(tiles, called_count)
+        if engine != 'dfs':
+            raise ValueError(f'Unknown engine: {engine}!')
         res = []
         counter = Counter(tiles)
         if called_count == 0:
@@ -168,39 +364,164 @@ class Mahjong:
         res = set([tuple(sorted(_, key=lambda x: (-len(x), x[0]))) for _ in res])
         return res
 
-    def calculate_ready_hand(self, tiles: str, to_unicode=True):
+    def _search_combinations_memo(self, tiles: List[int], called_count):
+        res = set()
+        counter = Counter(tiles)
+        if called_count == 0:
+            if all(i == 2 for i in counter.values()) and len(counter) == 7:
+                res.add(tuple((i, i) for i in sorted(counter.keys())))
+        if len(tiles) != 3 * (4 - called_count) + 2 or any(tile not in TILE_INDEX for tile in counter):
+            return res
+        counts, perm = _canonical_counts(tuple(counter[tile] for tile in TILE_IDS))
+        for split in _split_counts(counts, True):
+            """在规范形式上拆分，再还原花色"""
+            melds = [tuple(restore_tiles([TILE_IDS[i] for i in meld], perm)) for meld in split]
+            res.update(self._orders(melds))
+        return res
+
+    def _orders(self, combination):
         """
-        听牌计算（必须包含雀头或单骑听雀头的情形）
-        万子:0-9m
-        饼子:0-9p
-        索子:0-9s
-        东南西北:1-4z
-        白发中:5-7z
-        :param tiles: 手牌字符串，若有副露则以空格隔离，例：19m19p19s1234567z，1233m 5555m 789m 123m
-        :param to_unicode: 是否将结果转化为易读的字符串
+        search_combinations按(长度, 首张)稳定排序，起始牌相同的刻子与顺子在结果中以各种先后顺序出现，
+        返回与之一致的全部排列
         """
-        hand_tiles, called_tiles = self.str2id(tiles)
-        hand_tiles = list(sorted(map(lambda x: x + 5 if x in AKA_DORA else x, hand_tiles)))
-        called_tiles = [list(sorted(map(lambda x: x + 5 if x in AKA_DORA else x, _))) for _ in called_tiles]
-        if not self.check_called_tiles(called_tiles):
-            return
-        res = set()
-        total_counter = Counter(hand_tiles + sum(called_tiles, []))
+        combination = sorted(combination, key=lambda x: (-len(x), x[0]))
+        groups = [list(g) for _, g in groupby(combination, key=lambda x: (-len(x), x[0]))]
+        return set(tuple(meld for group in orders for meld in group) for orders in product(*[set(permutations(g)) for g in groups]))
 
+    def _proto_melds(self, a, b):
+        """两张牌(a<=b)构成的搭子的听牌及补全后的面子"""
+        if a == b:
+            return [(a, (a, a, a))]
+        if a in HONORS or a // 10 != b // 10:
+            return []
+        if b == a + 1:
+            res = []
+            if a % 10 >= 1:
+                res.append((a - 1, (a - 1, a, b)))
+            if b % 10 <= 7:
+                res.append((b + 1, (a, b, b + 1)))
+            return res
+        if b == a + 2:
+            return [(a + 1, (a, a + 1, b))]
+        return []
+
+    def search_partial_combinations(self, tiles: List[int], called_count):
+        """
+        听牌型（13张）的部分拆分: 去掉若干面子后剩1张（单骑）或雀头+搭子。
+        对每种听牌w，结果与search_combinations(tiles + [w], called_count)相同，
+        但只需拆分一次13张手牌
+        :return: {听牌: 和了型的全部拆分}
+        """
+        res = {}
+        counter = Counter(tiles)
+        melds_needed = 4 - called_count
+
+        def add(wait, combination):
+            res.setdefault(wait, set()).update(self._orders(combination))
+
+        if called_count == 0 and len(counter) == 7 and sorted(counter.values()) == [1, 2, 2, 2, 2, 2, 2]:
+            """七对子"""
+            single = [tile for tile, n in counter.items() if n == 1][0]
+            add(single, [(i, i) for i in counter.keys()])
+
+        candidates = sorted(set(self._search_meld(tiles)))
+
+        def split(start, current, left):
+            if len(current) == melds_needed and left == 1:
+                tile = [tile for tile, n in counter.items() if n][0]
+                add(tile, current + [(tile, tile)])
+            if len(current) == melds_needed - 1 and left == 4:
+                rest = sorted(tile for tile, n in counter.items() for _ in range(n))
+                for i in set(rest):
+                    if counter[i] < 2:
+                        continue
+                    a, b = self._remove_items(rest, [i, i])
+                    for wait, meld in self._proto_melds(a, b):
+                        add(wait, current + [(i, i), meld])
+            if len(current) >= melds_needed:
+                return
+            for index in range(start, len(candidates)):
+                meld = candidates[index]
+                if any(counter[tile] < meld.count(tile) for tile in meld):
+                    continue
+                counter.subtract(meld)
+                split(index, current + [meld], left - 3)
+                counter.update(meld)
+        split(0, [], len(tiles))
+        return res
+
+    def thirteen_orphans_wait(self, hand_tiles: List[int], called_tiles: List[List[int]]):
+        """国士无双的听牌，非国士无双听牌型时返回None"""
         if len(hand_tiles) == 13 and not called_tiles:
             """Check thirteen orphans"""
             diff = TERMINALS_HONORS.difference(set(hand_tiles))
             diff.update(set(hand_tiles).difference(TERMINALS_HONORS))
             if len(diff) <= 1:
+                res = set()
                 if len(diff) == 1:
                     res.add(diff.pop())
                 else:
                     res.update(TERMINALS_HONORS)
-                return self.id2unicode(res) if to_unicode else res
+                return res
+
+    def ready_hand(self, hand_tiles: List[int], called_tiles: List[List[int]], engine='dfs'):
+        """
+        听牌计算
+        :param hand_tiles: 已去除赤宝牌标记并排序的手牌id
+        :param called_tiles: 已去除赤宝牌标记并排序的副露id
+        :param engine: 'dfs'为逐张深度优先搜索，'table'为查询预计算听牌表（须先用python -m mahjong.wait_table生成）
+        """
+        if engine not in ('dfs', 'table'):
+            raise ValueError(f'Unknown engine: {engine}!')
+        res = self.thirteen_orphans_wait(hand_tiles, called_tiles)
+        if res is not None:
+            return res
 
+        res = set()
+        total_counter = Counter(hand_tiles + sum(called_tiles, []))
+        if engine == 'table' and all(n <= 4 for n in total_counter.values()):
+            from mahjong.wait_table import load_wait_table
+            return load_wait_table().ready_hand(hand_tiles, len(called_tiles), total_counter)
         for i in ALL:
             if total_counter[i] < 4:
                 combs = self.search_combinations(hand_tiles + [i], len(called_tiles))
                 if combs:
                     res.add(i)
+        return res
+
+    def calculate_ready_hand(self, tiles: str, to_unicode=True, engine='dfs'):
+        """
+        听牌计算（必须包含雀头或单骑听雀头的情形）
+        万子:0-9m
+        饼子:0-9p
+        索子:0-9s
+        东南西北:1-4z
+        白发中:5-7z
+        :param tiles: 手牌字符串，若有副露则以空格隔离，例：19m19p19s1234567z，1233m 5555m 789m 123m
+        :param to_unicode: 是否将结果转化为易读的字符串
+        :param engine: 听牌搜索方式，'dfs'或'table'
+        """
+        hand_tiles, called_tiles = self.str2id(tiles)
+        hand_tiles = list(sorted(map(lambda x: x + 5 if x in AKA_DORA else x, hand_tiles)))
+        called_tiles = [list(sorted(map(lambda x: x + 5 if x in AKA_DORA else x, _))) for _ in called_tiles]
+        if not self.check_called_tiles(called_tiles):
+            return
+        res = self.ready_hand(hand_tiles, called_tiles, engine)
         return self.id2unicode(res) if to_unicode else res
+
+    def unseen_counter(self, tiles: str, *visible: str):
+        """
+        未见牌（牌山与他家手牌）中各牌的张数
+        :param tiles: 手牌字符串，若有副露则以空格隔离（暗杠按4张计）
+        :param visible: 其余可见牌字符串，如牌河、宝牌指示牌
+        """
+        hand_tiles, called_tiles = self.str2id(tiles)
+        seen = hand_tiles + sum([_[:4] for _ in called_tiles], [])
+        for tiles in visible:
+            if tiles.strip():
+                hand_tiles, called_tiles = self.str2id(tiles.strip())
+                seen += hand_tiles + sum(called_tiles, [])
+        counter = Counter(map(lambda x: x + 5 if x in AKA_DORA else x, seen))
+        if any(n > 4 for n in counter.values()):
+            raise ValueError('Too many tiles!')
+        return Counter({tile: 4 - counter[tile] for tile in ALL})
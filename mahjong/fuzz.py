@@ -0,0 +1,298 @@
+"""
+拆分、听牌、计分各引擎的差分模糊测试
+
+随机与针对性地生成手牌（清一色等拆法多的手牌、字牌幺九牌密集的手牌、含副露与杠的手牌、和了型及其听牌型），
+分别交给参考实现与其他引擎计算，结果不同时报告输入，并将其缩减为仍能复现差异的最小输入。
+    search_combinations: Mahjong.search_combinations的'dfs'（参考）与'memo'
+    ready_hand: Mahjong.calculate_ready_hand的'dfs'（参考）与'table'
+    score: ScoreCalculator.update（参考）、以'memo'拆分结果调用_update、scenario_grid
+用法（'table'引擎需先生成听牌表: python -m mahjong.wait_table）:
+    python -m mahjong.fuzz 60
+    fuzz(seconds=60, workers=4)
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial, wraps
+from itertools import combinations as subsets
+
+import numpy as np
+
+from mahjong.checker import Mahjong, TILE_IDS, AKA_DORA, HONORS, TERMINALS_HONORS
+from mahjong.generator import HandGenerator, WIN_CLASSES, TILE_ID_ARRAY
+from mahjong.score import ScoreCalculator
+
+"""
+测试用例: (手牌id的tuple, 副露的tuple, 和了牌id或None, 情景参数的tuple)
+手牌可含赤宝牌；search_combinations与ready_hand不使用和了牌与情景参数
+"""
+
+_checker = Mahjong()
+_calculator = ScoreCalculator()
+
+
+def _normalize(tiles):
+    return sorted(map(lambda x: x + 5 if x in AKA_DORA else x, tiles))
+
+
+def case_str(case):
+    """用例的手牌字符串（副露以空格隔离）"""
+    hand, called, _, _ = case
+    return ' '.join([_checker.id2str(hand), *(_checker.id2str(meld) for meld in called)])
+
+
+def _guard(func):
+    """引擎抛出的异常也作为结果比较"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            return f'{type(e).__name__}: {e}'
+    return wrapper
+
+
+@_guard
+def _search(case, engine='dfs'):
+    hand, called, _, _ = case
+    return _checker.search_combinations(_normalize(hand), len(called), engine=engine)
+
+
+@_guard
+def _ready_hand(case, engine='dfs'):
+    return _checker.calculate_ready_hand(case_str(case), False, engine=engine)
+
+
+def _score_params(case):
+    _, called, hu, context = case
+    context = dict(context)
+    return _checker.id2str([hu]), context
+
+
+@_guard
+def _score(case):
+    hu, context = _score_params(case)
+    _calculator.update(case_str(case), hu, **context)
+    return _calculator._result(context['dealer_wind'] == 1, context['is_self_draw'])
+
+
+@_guard
+def _score_memo(case):
+    hu, context = _score_params(case)
+    hand_tiles, called_tiles = _checker.str2id(case_str(case))
+    hu_tile = _checker.str2id(hu)[0][0]
+    tiles = _normalize(hand_tiles + [hu_tile])
+    calculator = _calculator
+    calculator.__init__()
+    combinations = _checker.search_combinations(tiles, len(called_tiles), engine='memo')
+    calculator._update(case_str(case), hand_tiles, called_tiles, hu_tile, combinations, **context)
+    return calculator._result(context['dealer_wind'] == 1, context['is_self_draw'])
+
+
+@_guard
+def _score_grid(case):
+    hu, context = _score_params(case)
+    scenarios = {'is_self_draw': [context.pop('is_self_draw')], 'lichi': [context.pop('lichi')]}
+    row = _calculator.scenario_grid(
+        case_str(case), hu, context.pop('prevailing_wind'), context.pop('dealer_wind'), context.pop('dora'),
+        context.pop('ura_dora'), scenarios, **context
+    )[0]
+    return {key: row[key] for key in ['fu', 'han', 'level', 'score', 'points', 'yaku_list', 'has_yaku']}
+
+
+"""{目标: (手牌张数（含副露，不含和了牌）, 参考实现, {引擎名: 实现})}"""
+TARGETS = {
+    'search_combinations': (14, _search, {'memo': partial(_search, engine='memo')}),
+    'ready_hand': (13, _ready_hand, {'table': partial(_ready_hand, engine='table')}),
+    'score': (13, _score, {'memo': _score_memo, 'scenario_grid': _score_grid})
+}
+
+
+class CaseGenerator:
+
+    def __init__(self, seed):
+        self.rng = np.random.default_rng(seed)
+        self.hands = HandGenerator(seed=self.rng.integers(1 << 32))
+
+    def _context(self):
+        rng = self.rng
+        return tuple(sorted({
+            'prevailing_wind': int(rng.integers(1, 5)),
+            'dealer_wind': int(rng.integers(1, 5)),
+            'is_self_draw': bool(rng.integers(2)),
+            'lichi': int(rng.integers(3)),
+            'dora': _checker.id2str(rng.choice(TILE_ID_ARRAY, size=int(rng.integers(1, 4))).tolist()),
+            'ura_dora': _checker.id2str(rng.choice(TILE_ID_ARRAY, size=int(rng.integers(0, 3))).tolist()),
+            'ippatsu': bool(rng.integers(2)),
+            'is_under_the_sea': bool(rng.integers(4) == 0),
+            'is_after_a_kong': bool(rng.integers(4) == 0),
+            'use_ancient_yaku': bool(rng.integers(2))
+        }.items()))
+
+    def _dense(self, size):
+        """清一色或字牌幺九牌密集的手牌"""
+        rng = self.rng
+        if rng.integers(2):
+            suit = int(rng.integers(3)) * 10
+            pool = [suit + i for i in range(9) for _ in range(4)]
+        else:
+            pool = [tile for tile in TERMINALS_HONORS for _ in range(4)]
+        return sorted(rng.choice(pool, size=size, replace=False).tolist())
+
+    def _winning(self, size):
+        """和了型，size为13时去掉一张作为和了牌（得到听牌型），返回(手牌, 和了牌或None)"""
+        shape = WIN_CLASSES[int(self.rng.integers(len(WIN_CLASSES)))]
+        counts, _ = self.hands.winning_hands(1, shape)
+        tiles = np.repeat(TILE_ID_ARRAY, counts[0]).tolist()
+        if size == 13:
+            return tiles, tiles.pop(int(self.rng.integers(14)))
+        return tiles, None
+
+    def _with_calls(self, hand):
+        """把手牌中的刻子、顺子改为副露，刻子有时改为明杠、暗杠"""
+        hand = list(hand)
+        called = []
+        for tile in sorted(set(hand)):
+            if tile in AKA_DORA or tile not in hand or self.rng.integers(3):
+                continue
+            if hand.count(tile) >= 3:
+                for _ in range(3):
+                    hand.remove(tile)
+                kind = int(self.rng.integers(3))
+                called.append((tile,) * (3 + kind))
+            elif tile not in HONORS and tile + 1 in hand and tile + 2 in hand:
+                for offset in range(3):
+                    hand.remove(tile + offset)
+                called.append((tile, tile + 1, tile + 2))
+        return hand, tuple(called)
+
+    def cases(self, count, size):
+        res = []
+        for _ in range(count):
+            kind = int(self.rng.integers(10))
+            hu = None
+            if kind < 4:
+                hand = self.hands.hands(1, size)[0].tolist()
+            elif kind < 6:
+                hand = self._dense(size)
+            else:
+                hand, hu = self._winning(size)
+            called = ()
+            if kind >= 8:
+                hand, called = self._with_calls(hand)
+            if size == 13 and hu is None:
+                hu = int(self.rng.choice(TILE_ID_ARRAY))
+            res.append((tuple(sorted(hand)), called, hu, self._context()))
+        return res
+
+
+def _compare(target, case):
+    """返回(不同的引擎名, 参考结果, 该引擎结果)，相同时返回None"""
+    _, reference, engines = TARGETS[target]
+    expected = reference(case)
+    for name, engine in engines.items():
+        result = engine(case)
+        if result != expected:
+            return name, expected, result
+    return None
+
+
+def _run(target, seed, count):
+    """工作进程: 生成并比较count个用例，返回(用例数, 第一个不同的用例或None)"""
+    size = TARGETS[target][0]
+    for case in CaseGenerator(seed).cases(count, size):
+        if _compare(target, case) is not None:
+            return count, case
+    return count, None
+
+
+def _candidates(case):
+    """比case更小的用例: 去掉3张手牌、去掉副露、把一张牌换成编号更小的牌、去掉情景参数"""
+    hand, called, hu, context = case
+    for removed in subsets(range(len(hand)), 3):
+        yield tuple(t for i, t in enumerate(hand) if i not in removed), called, hu, context
+    for i in range(len(called)):
+        yield hand, called[:i] + called[i + 1:], hu, context
+    for i, tile in enumerate(hand):
+        for smaller in TILE_IDS:
+            if smaller >= tile:
+                break
+            yield tuple(sorted(hand[:i] + (smaller,) + hand[i + 1:])), called, hu, context
+    defaults = {'ippatsu': False, 'is_under_the_sea': False, 'is_after_a_kong': False, 'use_ancient_yaku': False, 'lichi': 0, 'dora': '', 'ura_dora': ''}
+    for i, (key, value) in enumerate(context):
+        if key in defaults and value != defaults[key]:
+            yield hand, called, hu, context[:i] + ((key, defaults[key]),) + context[i + 1:]
+
+
+def shrink(target, case, max_steps=1000):
+    """贪心缩减仍能复现差异的用例"""
+    for _ in range(max_steps):
+        for candidate in _candidates(case):
+            if _compare(target, candidate) is not None:
+                case = candidate
+                break
+        else:
+            break
+    return case
+
+
+def fuzz(targets=tuple(TARGETS), seconds=60, workers=None, seed=0, batch_size=200, log=print):
+    """
+    在时间预算内对各目标进行差分测试，发现差异即停止
+    :param targets: TARGETS中的目标
+    :param seconds: 时间预算（秒）
+    :param workers: 工作进程数（None为CPU核数，0或1时在当前进程内计算）
+    :param seed: 随机种子，相同种子生成相同用例
+    :param batch_size: 每个任务的用例数
+    :param log: 每个任务完成后以进度字符串调用
+    :return: {'cases': {目标: 用例数}, 'throughput': 每秒用例数, 'mismatch': None或差异的详细信息}
+    """
+    start = time.perf_counter()
+    seeds = ([seed, i] for i in range(1 << 62))
+    counts = {target: 0 for target in targets}
+    mismatch = None
+    tasks = ((target, next(seeds), batch_size) for _ in iter(int, 1) for target in targets)
+
+    def done(target, count, case):
+        nonlocal mismatch
+        counts[target] += count
+        elapsed = time.perf_counter() - start
+        log(f'{elapsed:.1f}s ' + ', '.join(f'{t}: {n}' for t, n in counts.items()) + f' ({sum(counts.values()) / elapsed:.0f}/s)')
+        if case is not None and mismatch is None:
+            shrunk = shrink(target, case)
+            engine, expected, result = _compare(target, shrunk)
+            mismatch = {
+                'target': target, 'engine': engine, 'case': case_str(case), 'shrunk': case_str(shrunk),
+                'hu_tile': None if shrunk[2] is None else _checker.id2str([shrunk[2]]), 'context': dict(shrunk[3]),
+                'expected': expected, 'result': result
+            }
+
+    def finished():
+        return mismatch is not None or time.perf_counter() - start >= seconds
+
+    if workers in (0, 1):
+        for target, task_seed, count in tasks:
+            done(target, *_run(target, task_seed, count))
+            if finished():
+                break
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            pending = []
+            for target, task_seed, count in tasks:
+                pending.append((target, executor.submit(_run, target, task_seed, count)))
+                if len(pending) < 2 * (workers or os.cpu_count() or 1):
+                    continue
+                target, future = pending.pop(0)
+                done(target, *future.result())
+                if finished():
+                    break
+            for future in [_[1] for _ in pending]:
+                future.cancel()
+    elapsed = time.perf_counter() - start
+    return {'cases': counts, 'throughput': sum(counts.values()) / elapsed, 'mismatch': mismatch}
+
+
+if __name__ == '__main__':
+    report = fuzz(seconds=float(sys.argv[1]) if len(sys.argv) > 1 else 60)
+    print(report)
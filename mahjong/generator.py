@@ -0,0 +1,192 @@
+"""
+随机牌山、手牌与和了型的批量生成（numpy向量化），用于压力测试、模糊测试与模拟
+
+牌以TILE_IDS中的下标(0-33)表示时，赤宝牌计为普通五；以牌id表示时赤宝牌为AKA_MAN/AKA_PIN/AKA_SOU。
+相同seed与参数得到相同结果。
+用法:
+    generator = HandGenerator(seed=0)
+    generator.hands(1000000)                        # (n, 13) 牌id
+    generator.winning_hands(10000, 'pure_hand')     # (张数向量, 和了牌下标)
+    generator.winning_hands(10, 'all_pungs', as_str=True)  # [(手牌字符串, 和了牌字符串)]，可直接传给update
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+from mahjong.checker import Mahjong, TILE_IDS, AKA_MAN, AKA_PIN, AKA_SOU
+
+TILE_ID_ARRAY = np.array(TILE_IDS, dtype=np.int8)
+
+"""面子（下标表示）: 34种刻子与21种顺子"""
+TRIPLET_MELDS = [(i, i, i) for i in range(34)]
+SEQUENCE_MELDS = [(i + j, i + j + 1, i + j + 2) for i in (0, 9, 18) for j in range(7)]
+MELDS = np.array(TRIPLET_MELDS + SEQUENCE_MELDS, dtype=np.int8)
+
+SIMPLES = [i for i in range(27) if i % 9 not in (0, 8)]
+DRAGON_INDICES = [31, 32, 33]
+
+"""
+和了型种类: {名称: (可用面子编号, 可用雀头下标, 固定的第一个面子编号)}
+pure_hand、half_flush先在万子（及字牌）中生成，再随机换成三种花色之一
+"""
+WIN_SHAPES = {
+    None: (list(range(len(MELDS))), list(range(34)), None),
+    'all_simple': (
+        [i for i, meld in enumerate(MELDS) if all(tile in SIMPLES for tile in meld)], SIMPLES, None
+    ),
+    'all_pungs': (list(range(34)), list(range(34)), None),
+    'value_tiles': (list(range(len(MELDS))), list(range(34)), DRAGON_INDICES),
+    'pure_hand': ([i for i, meld in enumerate(MELDS) if meld[-1] < 9], list(range(9)), None),
+    'half_flush': (
+        [i for i, meld in enumerate(MELDS) if meld[-1] < 9 or meld[0] >= 27], [*range(9), *range(27, 34)], None
+    )
+}
+WIN_CLASSES = [*WIN_SHAPES, 'seven_pairs']
+
+
+def deck(aka=True):
+    """136张牌的id（np.int8），aka为True时每种花色的一张五换成赤宝牌"""
+    tiles = np.repeat(TILE_ID_ARRAY, 4)
+    if aka:
+        for i, aka_tile in zip((4, 13, 22), (AKA_MAN, AKA_PIN, AKA_SOU)):
+            tiles[4 * i] = aka_tile
+    return tiles
+
+
+"""牌id -> 下标（赤宝牌同普通五），以id + 1为下标查表"""
+ID2INDEX = np.zeros(max(TILE_IDS) + 2, dtype=np.int8)
+ID2INDEX[TILE_ID_ARRAY + 1] = np.arange(34)
+ID2INDEX[[AKA_MAN + 1, AKA_PIN + 1, AKA_SOU + 1]] = [4, 13, 22]
+
+
+def to_indices(tiles: np.ndarray):
+    """牌id数组 -> 下标数组"""
+    return ID2INDEX[tiles.astype(np.int64) + 1]
+
+
+def to_counts(indices: np.ndarray):
+    """(n, k)下标数组 -> (n, 34)张数向量"""
+    n = len(indices)
+    offsets = indices.astype(np.int64) + 34 * np.arange(n)[:, None]
+    return np.bincount(offsets.ravel(), minlength=34 * n).reshape(n, 34).astype(np.int8)
+
+
+class HandGenerator:
+
+    def __init__(self, seed=None, aka=True, batch_size=100000):
+        """
+        :param seed: 随机种子
+        :param aka: 牌山是否含赤宝牌
+        :param batch_size: 每批生成的数量，限制临时数组的大小
+        """
+        self.rng = np.random.default_rng(seed)
+        self.deck = deck(aka)
+        self.batch_size = batch_size
+        self.checker = Mahjong()
+
+    def _batches(self, n):
+        for start in range(0, n, self.batch_size):
+            yield min(self.batch_size, n - start)
+
+    def walls(self, n):
+        """(n, 136)洗好的牌山（牌id）"""
+        return np.concatenate([
+            self.rng.permuted(np.broadcast_to(self.deck, (size, len(self.deck))), axis=1) for size in self._batches(n)
+        ]) if n else np.zeros((0, len(self.deck)), dtype=np.int8)
+
+    def hands(self, n, size=13, as_counts=False, as_str=False):
+        """
+        从洗好的牌山中发出的手牌
+        :param size: 每手张数
+        :param as_counts: 返回(n, 34)张数向量
+        :param as_str: 返回手牌字符串列表（赤宝牌写作0）
+        :return: 默认为(n, size)牌id，每行已排序
+        """
+        res = []
+        for batch in self._batches(n):
+            """独立抽取牌山中的位置，重抽有重复位置的行（各位置组合仍为等概率）"""
+            positions = np.sort(self.rng.integers(0, len(self.deck), size=(batch, size), dtype=np.int16), axis=1)
+            redraw = (np.diff(positions, axis=1) == 0).any(axis=1)
+            while redraw.any():
+                new = np.sort(self.rng.integers(0, len(self.deck), size=(redraw.sum(), size), dtype=np.int16), axis=1)
+                positions[redraw] = new
+                redraw[redraw] = (np.diff(new, axis=1) == 0).any(axis=1)
+            res.append(np.sort(self.deck[positions], axis=1))
+        tiles = np.concatenate(res) if res else np.zeros((0, size), dtype=np.int8)
+        if as_counts:
+            return to_counts(to_indices(tiles))
+        if as_str:
+            return [self.checker.id2str(row.tolist()) for row in tiles]
+        return tiles
+
+    def _shape_indices(self, n, shape):
+        """(n, 14)下标数组，4面子1雀头，可能有某种牌超过4张"""
+        melds, pairs, first = WIN_SHAPES[shape]
+        chosen = self.rng.choice(np.array(melds), size=(n, 4))
+        if first is not None:
+            chosen[:, 0] = self.rng.choice(np.array(first), size=n)
+        pair = self.rng.choice(np.array(pairs, dtype=np.int8), size=n)
+        indices = np.concatenate([MELDS[chosen].reshape(n, 12), pair[:, None], pair[:, None]], axis=1)
+        if shape in ('pure_hand', 'half_flush'):
+            suit = self.rng.integers(0, 3, size=n).astype(np.int8)[:, None]
+            indices = np.where(indices < 27, indices + 9 * suit, indices)
+        return indices
+
+    def _seven_pairs_indices(self, n):
+        pairs = np.argpartition(self.rng.random((n, 34)), 6, axis=1)[:, :7]
+        return np.concatenate([pairs, pairs], axis=1)
+
+    def winning_hands(self, n, shape=None, as_str=False):
+        """
+        门清和了型（不含副露）
+        :param shape: 和了型种类（WIN_CLASSES之一），None为任意4面子1雀头；
+            'all_simple'断幺九、'all_pungs'对对和、'value_tiles'含三元牌刻子、'pure_hand'清一色、
+            'half_flush'混一色（可能不含字牌，即清一色）、'seven_pairs'七对子（也可能拆成二杯口）
+        :param as_str: 返回[(13张手牌字符串, 和了牌字符串)]
+        :return: ((n, 34)张数向量（含和了牌）, (n,)和了牌下标)
+        """
+        if shape not in WIN_CLASSES:
+            raise ValueError('Unknown winning shape!')
+        res = []
+        total = 0
+        while total < n:
+            size = min(self.batch_size, 2 * (n - total) + 16)
+            if shape == 'seven_pairs':
+                indices = self._seven_pairs_indices(size)
+            else:
+                indices = self._shape_indices(size, shape)
+            counts = to_counts(indices)
+            valid = (counts <= 4).all(axis=1)
+            indices, counts = indices[valid][:n - total], counts[valid][:n - total]
+            hu = indices[np.arange(len(indices)), self.rng.integers(0, 14, size=len(indices))]
+            res.append((counts, hu))
+            total += len(counts)
+        counts = np.concatenate([_[0] for _ in res]) if res else np.zeros((0, 34), dtype=np.int8)
+        hu = np.concatenate([_[1] for _ in res]) if res else np.zeros(0, dtype=np.int8)
+        if as_str:
+            return self.to_strings(counts, hu)
+        return counts, hu
+
+    def to_strings(self, counts: np.ndarray, hu: np.ndarray) -> List[Tuple[str, str]]:
+        """张数向量（含和了牌）与和了牌下标 -> [(手牌字符串, 和了牌字符串)]"""
+        res = []
+        for row, tile in zip(counts, hu):
+            row = row.copy()
+            row[tile] -= 1
+            hand = np.repeat(TILE_ID_ARRAY, row).tolist()
+            res.append((self.checker.id2str(hand), self.checker.id2str([TILE_IDS[tile]])))
+        return res
+
+
+if __name__ == '__main__':
+    import time
+    generator = HandGenerator(seed=0)
+    start = time.perf_counter()
+    tiles = generator.hands(1000000)
+    print(f'hands: {1000000 / (time.perf_counter() - start):.0f}/s')
+    start = time.perf_counter()
+    generator.winning_hands(1000000)
+    print(f'winning hands: {1000000 / (time.perf_counter() - start):.0f}/s')
+    print(generator.hands(3, as_str=True))
+    for shape in WIN_CLASSES:
+        print(shape, generator.winning_hands(2, shape, as_str=True))
@@ -0,0 +1,166 @@
+"""
+计分、听牌热点路径的内存预算检查（tracemalloc）
+
+对固定的手牌集合，逐手记录一次ScoreCalculator.update、Mahjong.calculate_ready_hand的
+峰值内存（相对调用前的增量，字节）与调用中的分配块数，超过BUDGETS中的预算即视为失败。
+tracemalloc只记录存活的内存块，调用返回前已释放的临时对象（Counter、排序后的列表、deepcopy的搜索路径等）
+不会出现在调用前后快照的差中。统计分配块数时用sys.settrace在每一行与每次返回时保留各帧的局部变量与返回值，
+使这些临时对象存活到调用后的快照，快照之差即为调用中创建的块数（测量期间关闭循环垃圾回收）；
+从未绑定到局部变量的中间结果（如直接作为参数的表达式）不计入。峰值在不跟踪的调用中单独测量。
+每手牌先预热一次，使lru_cache等缓存在测量前已经填充。
+用法:
+    python -m mahjong.memory_budget          # 有超出预算的手牌时退出码为1
+    check()                                  # [(种类, 手牌, 峰值, 分配块数, 预算)]，仅含超出预算的项
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+from mahjong.checker import Mahjong
+from mahjong.score import ScoreCalculator
+
+"""update的测试手牌: (手牌, 和了牌, 其余参数)"""
+UPDATE_CORPUS = [
+    ('123m456p789s1122z', '2z', {'prevailing_wind': 1, 'dealer_wind': 2, 'is_self_draw': False, 'lichi': 1, 'dora': '1z', 'ura_dora': '3m'}),
+    ('2234455m345p666s', '5m', {'prevailing_wind': 1, 'dealer_wind': 1, 'is_self_draw': True, 'lichi': 0, 'dora': '4m', 'ura_dora': ''}),
+    ('1112345678999m', '5m', {'prevailing_wind': 2, 'dealer_wind': 3, 'is_self_draw': True, 'lichi': 1, 'dora': '9m', 'ura_dora': '8m'}),
+    ('1122335566778m', '8m', {'prevailing_wind': 1, 'dealer_wind': 4, 'is_self_draw': False, 'lichi': 2, 'dora': '7m', 'ura_dora': ''}),
+    ('11223344556677s', '7s', {'prevailing_wind': 1, 'dealer_wind': 2, 'is_self_draw': True, 'lichi': 1, 'dora': '6s', 'ura_dora': '1z'}),
+    ('19m19p19s1234567z', '1m', {'prevailing_wind': 1, 'dealer_wind': 1, 'is_self_draw': False, 'lichi': 0, 'dora': '1z', 'ura_dora': ''}),
+    ('234m5p 055m 777z 6666s', '5p', {'prevailing_wind': 2, 'dealer_wind': 2, 'is_self_draw': True, 'is_after_a_kong': True, 'lichi': 0, 'dora': '4m', 'ura_dora': ''}),
+    ('1z 22222z 33333z 4444z 555z', '1z', {'prevailing_wind': 1, 'dealer_wind': 1, 'is_self_draw': False, 'lichi': 0, 'dora': '1z', 'ura_dora': ''}),
+]
+
+"""calculate_ready_hand的测试手牌"""
+READY_HAND_CORPUS = [
+    '1112345678999m',
+    '2223334445556m',
+    '1122335566778m',
+    '19m19p19s1234567z',
+    '123m456p789s1122z',
+    '23456m 789p 111z 5555s',
+    '1234567891234m',
+]
+
+"""
+预算: {(种类, 手牌): (峰值字节数, 分配块数)}
+在CPython 3.11上测得的值约留25%余量；改进实现后请同步调低
+"""
+BUDGETS = {
+    ('update', '123m456p789s1122z'): (18176, 1500),
+    ('update', '2234455m345p666s'): (12288, 1390),
+    ('update', '1112345678999m'): (21760, 4620),
+    ('update', '1122335566778m'): (14080, 1200),
+    ('update', '11223344556677s'): (13568, 5170),
+    ('update', '19m19p19s1234567z'): (5632, 160),
+    ('update', '234m5p 055m 777z 6666s'): (7680, 330),
+    ('update', '1z 22222z 33333z 4444z 555z'): (7424, 240),
+    ('ready_hand', '1112345678999m'): (52224, 140810),
+    ('ready_hand', '2223334445556m'): (58112, 88860),
+    ('ready_hand', '1122335566778m'): (43776, 30350),
+    ('ready_hand', '19m19p19s1234567z'): (2560, 40),
+    ('ready_hand', '123m456p789s1122z'): (50688, 11960),
+    ('ready_hand', '23456m 789p 111z 5555s'): (36864, 2760),
+    ('ready_hand', '1234567891234m'): (48384, 94380)
+}
+
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _pin(pinned):
+    """
+    sys.settrace的跟踪函数: mahjong包中的函数每执行一行及返回时，把帧的局部变量与返回值保留在pinned（以id为键）中；
+    标准库（deepcopy、Counter等）内部的帧不跟踪，其结果在赋给包内函数的局部变量或参数时保留
+    """
+    def trace(frame, event, arg):
+        if event == 'call':
+            return trace if frame.f_code.co_filename.startswith(PACKAGE_DIR) else None
+        for value in frame.f_locals.values():
+            pinned[id(value)] = value
+        if event == 'return':
+            pinned[id(arg)] = arg
+        return trace
+    return trace
+
+
+def count_allocations(func):
+    """调用中创建的块数（见模块说明），func应已预热"""
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    gc.collect()
+    before = tracemalloc.take_snapshot().filter_traces(ignore)
+    pinned = {}
+    tracer = sys.gettrace()
+    gc.disable()
+    sys.settrace(_pin(pinned))
+    try:
+        func()
+    finally:
+        sys.settrace(tracer)
+        gc.enable()
+    after = tracemalloc.take_snapshot().filter_traces(ignore)
+    return sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+
+
+def measure(func, repeat=3):
+    """
+    func的峰值内存增量（取repeat次中的最小值）与分配块数
+    :return: (峰值字节数, 分配块数)
+    """
+    started = tracemalloc.is_tracing()
+    if not started:
+        tracemalloc.start()
+    try:
+        func()
+        peaks = []
+        for _ in range(repeat):
+            gc.collect()
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - current)
+        return min(peaks), count_allocations(func)
+    finally:
+        if not started:
+            tracemalloc.stop()
+
+
+def measure_corpus():
+    """[(种类, 手牌, 峰值字节数, 分配块数)]"""
+    calculator = ScoreCalculator()
+    checker = Mahjong()
+    res = []
+    for tiles, hu_tile, context in UPDATE_CORPUS:
+        peak, allocations = measure(lambda: calculator.update(tiles, hu_tile, **context))
+        res.append(('update', tiles, peak, allocations))
+    for tiles in READY_HAND_CORPUS:
+        peak, allocations = measure(lambda: checker.calculate_ready_hand(tiles, False))
+        res.append(('ready_hand', tiles, peak, allocations))
+    return res
+
+
+def check(budgets=None):
+    """
+    :param budgets: 默认为BUDGETS，未列出的手牌不检查
+    :return: [(种类, 手牌, 峰值字节数, 分配块数, 预算)]，仅含超出预算的项
+    """
+    budgets = BUDGETS if budgets is None else budgets
+    res = []
+    for kind, tiles, peak, allocations in measure_corpus():
+        budget = budgets.get((kind, tiles))
+        if budget is not None and (peak > budget[0] or allocations > budget[1]):
+            res.append((kind, tiles, peak, allocations, budget))
+    return res
+
+
+if __name__ == '__main__':
+    failed = []
+    for kind, tiles, peak, allocations in measure_corpus():
+        budget = BUDGETS.get((kind, tiles))
+        over = budget is not None and (peak > budget[0] or allocations > budget[1])
+        if over:
+            failed.append((kind, tiles))
+        print(f'{kind:<10} {tiles:<28} peak: {peak:>8} B, allocations: {allocations:>6}, budget: {budget}' + (' OVER' if over else ''))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,149 @@
+"""
+精确和了率计算
+
+将未见牌（牌山与他家手牌）视为等概率排列的牌山，对剩余N次自摸用动态规划精确计算自摸和了的概率。
+两种打法:
+    keep=True: 手牌固定（如立直后摸切），状态为(剩余摸牌数, 未见牌数, 和了牌张数)，时间、空间均为O(N)
+    keep=False: 每次摸牌后选择使和了率最大的切牌，状态为(手牌张数向量, 未见牌张数向量, 剩余摸牌数)。
+        每个状态至多展开34种摸牌×14种切牌，最坏需O((34×14)^(N-1))次听牌查询，实际因记忆化远小于此。
+        状态键为69字节的bytes，每个状态约占200字节，状态数超过max_states（默认20万，约40MB）时抛出ValueError。
+听牌查询默认在已生成听牌表（python -m mahjong.wait_table）时查表，否则逐张搜索，两者结果相同。
+"""
+from functools import lru_cache
+from typing import Dict, List
+
+from mahjong.checker import Mahjong, AKA_DORA, TILE_IDS, TILE_INDEX, canonicalize, restore_tiles
+from mahjong.wait_table import default_engine
+
+
+@lru_cache(maxsize=None)
+def _keep_probability(draws, total, outs):
+    """手牌固定时，未见牌total张中有outs张和了牌，draws次摸牌内摸到和了牌的概率"""
+    if draws == 0 or outs == 0:
+        return 0.
+    return outs / total + (total - outs) / total * _keep_probability(draws - 1, total - 1, outs)
+
+
+class WinProbability:
+
+    def __init__(self, engine=None, max_states=200000):
+        """
+        :param engine: 听牌计算方式，见Mahjong.ready_hand；None时听牌表已生成则为'table'，否则为'dfs'
+        :param max_states: keep=False时记忆化状态数上限，也是听牌缓存的条目数上限
+        """
+        self.checker = Mahjong()
+        self.engine = default_engine() if engine is None else engine
+        self.max_states = max_states
+        self._called_tiles = []
+        self._memo = {}
+        self._hand_waits = {}
+        """听牌缓存: 以花色对称的规范形式（手牌, 副露）为键，各次calculate共用"""
+        self._waits = {}
+
+    def _parse(self, tiles: str):
+        hand_tiles, called_tiles = self.checker.str2id(tiles)
+        hand_tiles = list(sorted(map(lambda x: x + 5 if x in AKA_DORA else x, hand_tiles)))
+        called_tiles = [list(sorted(map(lambda x: x + 5 if x in AKA_DORA else x, _))) for _ in called_tiles]
+        if not self.checker.check_called_tiles(called_tiles):
+            raise ValueError('Wrong called tiles!')
+        return hand_tiles, called_tiles
+
+    def _reset(self, called_tiles):
+        self._called_tiles = called_tiles
+        self._memo = {}
+        self._hand_waits = {}
+
+    def _wait_indices(self, hand: bytes) -> List[int]:
+        """手牌张数向量的听牌（牌的下标），按手牌缓存；听牌在规范形式上计算，再还原花色"""
+        if hand not in self._hand_waits:
+            hand_tiles = [tile for tile, n in zip(TILE_IDS, hand) for _ in range(n)]
+            hand_tiles, called_tiles, perm = canonicalize(hand_tiles, self._called_tiles)
+            hand_tiles, called_tiles = sorted(hand_tiles), [sorted(_) for _ in called_tiles]
+            key = tuple(hand_tiles), tuple(map(tuple, called_tiles))
+            if key not in self._waits:
+                if len(self._waits) >= self.max_states:
+                    self._waits = {}
+                self._waits[key] = self.checker.ready_hand(hand_tiles, called_tiles, self.engine)
+            self._hand_waits[hand] = [TILE_INDEX[_] for _ in restore_tiles(self._waits[key], perm)]
+        return self._hand_waits[hand]
+
+    def _optimal(self, hand: bytes, wall: bytes, draws, total):
+        key = hand + wall + bytes([draws])
+        if key in self._memo:
+            return self._memo[key]
+        waits = self._wait_indices(hand)
+        value = sum(wall[i] for i in waits) / total
+        if draws > 1:
+            for i, n in enumerate(wall):
+                if n == 0 or i in waits:
+                    continue
+                drawn = bytearray(hand)
+                drawn[i] += 1
+                rest = bytearray(wall)
+                rest[i] -= 1
+                rest = bytes(rest)
+                best = 0.
+                for j, m in enumerate(drawn):
+                    if m == 0:
+                        continue
+                    drawn[j] -= 1
+                    best = max(best, self._optimal(bytes(drawn), rest, draws - 1, total - 1))
+                    drawn[j] += 1
+                value += n / total * best
+        if len(self._memo) >= self.max_states:
+            raise ValueError('Too many states!')
+        self._memo[key] = value
+        return value
+
+    def _probability(self, hand_tiles, unseen, draws, keep):
+        total = sum(unseen.values())
+        draws = min(draws, total)
+        if draws <= 0:
+            return 0.
+        hand = bytes(hand_tiles.count(tile) for tile in TILE_IDS)
+        if keep:
+            outs = sum(unseen[TILE_IDS[i]] for i in self._wait_indices(hand))
+            return _keep_probability(draws, total, outs)
+        wall = bytes(unseen[tile] for tile in TILE_IDS)
+        return self._optimal(hand, wall, draws, total)
+
+    def calculate(self, tiles: str, draws, discards: str = '', dora: str = '', visible: str = '', keep=True) -> float:
+        """
+        :param tiles: 13张手牌字符串，若有副露则以空格隔离
+        :param draws: 剩余自摸次数
+        :param discards: 牌河（所有人的舍牌，含被鸣的牌之外的全部）
+        :param dora: 宝牌指示牌
+        :param visible: 其余可见牌（他家副露等）
+        :param keep: 是否固定手牌
+        :return: draws次摸牌内自摸和了的概率
+        """
+        hand_tiles, called_tiles = self._parse(tiles)
+        if len(hand_tiles) + 3 * len(called_tiles) != 13:
+            raise ValueError('Wrong number of tiles!')
+        self._reset(called_tiles)
+        unseen = self.checker.unseen_counter(tiles, discards, dora, visible)
+        return self._probability(hand_tiles, unseen, draws, keep)
+
+    def calculate_discards(self, tiles: str, draws, discards: str = '', dora: str = '', visible: str = '', keep=True) -> Dict[str, float]:
+        """
+        对14张手牌的每一种切牌计算和了率，各切牌共用记忆化状态
+        :return: {切牌字符串: 和了率}
+        """
+        hand_tiles, called_tiles = self._parse(tiles)
+        if len(hand_tiles) + 3 * len(called_tiles) != 14:
+            raise ValueError('Wrong number of tiles!')
+        self._reset(called_tiles)
+        unseen = self.checker.unseen_counter(tiles, discards, dora, visible)
+        res = {}
+        for tile in sorted(set(hand_tiles)):
+            rest = list(hand_tiles)
+            rest.remove(tile)
+            res[self.checker.id2str([tile])] = self._probability(rest, unseen, draws, keep)
+        return res
+
+
+if __name__ == '__main__':
+    calculator = WinProbability()
+    print(calculator.calculate('234567m345p5678s', draws=6, discards='1m9p', keep=True))
+    print(calculator.calculate('234567m345p5678s', draws=3, discards='1m9p', keep=False))
+    print(calculator.calculate_discards('234567m345p56788s', draws=2, discards='1m9p', keep=False))
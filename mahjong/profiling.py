@@ -0,0 +1,139 @@
+"""
+ScoreCalculator.update的性能分析
+
+记录每次update各阶段（解析、计数、拆分搜索、役种计算及其余部分）的耗时与调用次数，
+calculate中每个役种判断、符数、宝牌计算的耗时，拆分搜索展开的节点数与得到的拆分数，以及因门槛条件跳过的判断数。
+用法:
+    with profile(calculator, callback=print) as profiler:
+        calculator.update(...)
+    profiler.as_dict()
+未启用时ScoreCalculator只多出几次属性判断；启用时以实例属性包装各判断函数，退出时移除。
+"""
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+PREDICATES = (
+    'all_simple', 'concealed_hand_self_drawn', 'value_tiles', 'sequence_hand', 'shiiaruraotai', 'seven_pairs',
+    'all_pungs', 'three_kongs', 'small_three_dragons', 'three_concealed_triplets', 'pure_straight',
+    'all_mixed_terminals', 'mixed_outside_hand', 'mixed_triple_chow', 'triple_pungs', 'all_types',
+    'three_consecutive_triplets', 'pure_double_chows', 'outside_hand', 'three_identical_sequences', 'pure_hand',
+    'ippinmoyue', 'cyupinraoyui', 'four_concealed_triplets', 'thirteen_orphans', 'four_kongs', 'big_three_dragons',
+    'all_green', 'all_honors', 'four_winds', 'all_terminals', 'nine_gates', 'big_seven_stars', 'big_wheels',
+    'big_bamboos', 'big_numbers', 'three_years_on_stone', 'blessing_of_heaven', 'blessing_of_earth', 'blessing_of_man',
+    'fussu', 'dora_count'
+)
+
+
+class Profiler:
+
+    def __init__(self, callback=None):
+        """
+        :param callback: 每次update结束后以该次的记录(dict)调用，可用于导出到监控系统
+        """
+        self.callback = callback
+        self.updates = 0
+        self.stage_time = defaultdict(float)
+        self.stage_calls = Counter()
+        self.predicate_time = defaultdict(float)
+        self.predicate_calls = Counter()
+        self.dfs_nodes = 0
+        self.combinations = 0
+        self.skipped_predicates = 0
+        self._record = None
+        self._last = None
+
+    def _new_record(self):
+        return {'stages': {}, 'predicates': defaultdict(float), 'dfs_nodes': 0, 'combinations': 0, 'skipped_predicates': 0}
+
+    def _wrap_search(self, search_meld):
+        @wraps(search_meld)
+        def wrapper(tiles):
+            if self._record is not None:
+                self._record['dfs_nodes'] += 1
+            return search_meld(tiles)
+        return wrapper
+
+    def _wrap_predicate(self, name, predicate):
+        @wraps(predicate)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return predicate(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.predicate_time[name] += elapsed
+                self.predicate_calls[name] += 1
+                if self._record is not None:
+                    self._record['predicates'][name] += elapsed
+        return wrapper
+
+    def attach(self, calculator):
+        calculator.profiler = self
+        for name in PREDICATES:
+            setattr(calculator, name, self._wrap_predicate(name, getattr(calculator, name)))
+
+    def detach(self, calculator):
+        for name in PREDICATES:
+            calculator.__dict__.pop(name, None)
+        calculator.__dict__.pop('profiler', None)
+
+    def mark(self, calculator, stage):
+        """由ScoreCalculator调用，表示stage阶段结束"""
+        now = time.perf_counter()
+        if stage == 'start':
+            self._finish()
+            self._record = self._new_record()
+            """update开始时拆分器已重新创建，需重新包装"""
+            calculator.checker._search_meld = self._wrap_search(calculator.checker._search_meld)
+        elif self._record is not None:
+            if stage == 'end':
+                stage = 'other'
+            self._record['stages'][stage] = self._record['stages'].get(stage, 0.) + now - self._last
+            if stage == 'search_combinations':
+                self._record['combinations'] = len(calculator.combinations)
+            if stage == 'calculate':
+                self._record['skipped_predicates'] = calculator.skipped_predicates
+            if stage == 'other':
+                self._finish()
+        self._last = time.perf_counter()
+
+    def _finish(self):
+        record = self._record
+        if record is None:
+            return
+        self._record = None
+        self.updates += 1
+        for stage, elapsed in record['stages'].items():
+            self.stage_time[stage] += elapsed
+            self.stage_calls[stage] += 1
+        self.dfs_nodes += record['dfs_nodes']
+        self.combinations += record['combinations']
+        self.skipped_predicates += record['skipped_predicates']
+        record['predicates'] = dict(record['predicates'])
+        if self.callback is not None:
+            self.callback(record)
+
+    def as_dict(self):
+        """累计结果，时间单位为秒"""
+        return {
+            'updates': self.updates,
+            'stages': {stage: {'time': self.stage_time[stage], 'calls': self.stage_calls[stage]} for stage in self.stage_time},
+            'predicates': {name: {'time': self.predicate_time[name], 'calls': self.predicate_calls[name]} for name in self.predicate_time},
+            'dfs_nodes': self.dfs_nodes,
+            'combinations': self.combinations,
+            'skipped_predicates': self.skipped_predicates
+        }
+
+
+@contextmanager
+def profile(calculator, callback=None):
+    """在with块内对calculator启用性能分析"""
+    profiler = Profiler(callback)
+    profiler.attach(calculator)
+    try:
+        yield profiler
+    finally:
+        profiler._finish()
+        profiler.detach(calculator)
@@ -0,0 +1,169 @@
+"""
+计分结果的定长二进制记录
+
+每手牌的结果存为一条RECORD_DTYPE记录（紧凑排列，无对齐填充）: 役种的位掩码与各役番数、宝牌数、符数、番数、
+打点等级、基本点、所得点数及最高打点的拆分编号。读取时以numpy.frombuffer直接映射到bytes、memoryview、mmap上，
+不复制数据；役种名称等可读字符串只在render时生成。
+役种编号（YAKU_NAMES中的下标）按役种在yaku_list中的输出顺序排列，按编号从小到大还原即得原顺序。
+用法:
+    data = to_records(results).tobytes()
+    records = read_records(data)              # 零复制
+    records['points'].mean()
+    render(records[0])                        # 与ScoreCalculator._result相同的dict
+"""
+import mmap
+from typing import Iterable
+
+import numpy as np
+
+from mahjong.score import REGULAR_RULES, YAKUMAN_RULES, SCORE_LEVELS, YAKU_MAN
+from mahjong.stats import yaku_name
+
+"""不依赖拆分的役种，按calculate中的输出顺序"""
+SITUATIONAL_YAKU = [
+    '一筒摸月', '海底捞月', '九筒捞鱼', '河底捞鱼', '岭上开花', '抢杠', '燕返', '杠振', '立直', '两立直', '一发', '门前清自摸和'
+]
+
+
+def _rule_names(label):
+    names = []
+    for n in range(1, 7):
+        name = yaku_name(label(n))
+        if name not in names:
+            names.append(name)
+    return names
+
+
+"""
+役种编号: 情景役、各拆分共用的一般役、逐个拆分判断的一般役、役满，各部分内按规则顺序
+（calculate先输出共用的一般役，再输出所选拆分的役种）
+"""
+YAKU_NAMES = [
+    *SITUATIONAL_YAKU,
+    *(name for _, each, label, *_ in REGULAR_RULES if not each for name in _rule_names(label)),
+    *(name for _, each, label, *_ in REGULAR_RULES if each for name in _rule_names(label)),
+    *dict.fromkeys(name for _, single, double, *_ in YAKUMAN_RULES for name in (single, double))
+]
+YAKU_IDS = {name: i for i, name in enumerate(YAKU_NAMES)}
+assert len(YAKU_NAMES) <= 64
+
+"""一手牌中同时成立的役种数上限"""
+MAX_YAKU = 16
+NO_COMBINATION = 255
+IS_HU, HAS_YAKU = 1, 2
+LEVEL_CODES = {name: level for level, name in SCORE_LEVELS.items()}
+
+RECORD_DTYPE = np.dtype([
+    ('yaku', '<u8'),
+    ('yaku_han', 'u1', (MAX_YAKU,)),
+    ('dora', 'u1'),
+    ('fu', 'u1'),
+    ('han', 'u1'),
+    ('level', 'u1'),
+    ('flags', 'u1'),
+    ('combination', 'u1'),
+    ('score', '<u4'),
+    ('points', '<u4')
+])
+
+
+def _han(yaku: str):
+    if yaku.endswith('(2倍役满)'):
+        return 26
+    if yaku.endswith('(役满)'):
+        return 13
+    return int(yaku[yaku.rindex('(') + 1:-2])
+
+
+def _level_code(level):
+    if level is None:
+        return 0
+    if level.endswith('倍役满'):
+        return YAKU_MAN
+    return LEVEL_CODES[level]
+
+
+def to_records(results: Iterable[dict], combinations: Iterable[int] = None):
+    """
+    :param results: 结果摘要（ScoreCalculator._result、ResultCache.score等）
+    :param combinations: 各结果所选拆分的编号（ScoreCalculator.max_score_index），默认不记录
+    :return: RECORD_DTYPE的数组
+    """
+    results = list(results)
+    combinations = [None] * len(results) if combinations is None else list(combinations)
+    records = np.zeros(len(results), dtype=RECORD_DTYPE)
+    for record, result, combination in zip(records, results, combinations):
+        han = []
+        mask = 0
+        for yaku in result['yaku_list'] or ():
+            if yaku.startswith('ドラ'):
+                record['dora'] = int(yaku.split()[-1])
+                continue
+            i = YAKU_IDS[yaku_name(yaku)]
+            mask |= 1 << i
+            han.append((i, _han(yaku)))
+        record['yaku'] = mask
+        record['yaku_han'][:len(han)] = [n for _, n in sorted(han)]
+        record['fu'] = result['fu'] or 0
+        record['han'] = result['han'] or 0
+        record['level'] = _level_code(result['level'])
+        record['flags'] = IS_HU * (result['fu'] is not None) | HAS_YAKU * bool(result['has_yaku'])
+        record['combination'] = NO_COMBINATION if combination is None else combination
+        record['score'] = result['score'] or 0
+        record['points'] = result['points']
+    return records
+
+
+def from_calculator(calculator, is_dealer, is_self_draw):
+    """ScoreCalculator当前结果的记录"""
+    return to_records([calculator._result(is_dealer, is_self_draw)], [calculator.max_score_index])[0]
+
+
+def read_records(buffer):
+    """bytes、bytearray、memoryview、mmap等 -> RECORD_DTYPE数组（与buffer共用内存）"""
+    return np.frombuffer(memoryview(buffer), dtype=RECORD_DTYPE)
+
+
+def open_records(path):
+    """以只读mmap映射记录文件"""
+    with open(path, 'rb') as f:
+        return read_records(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def yaku_list(record):
+    """记录中的役种 -> yaku_list字符串"""
+    mask = int(record['yaku'])
+    res = []
+    for n, i in zip(record['yaku_han'], (i for i in range(len(YAKU_NAMES)) if mask >> i & 1)):
+        name = YAKU_NAMES[i]
+        if n == 26:
+            res.append(f'{name}(2倍役满)')
+        elif n == 13:
+            res.append(f'{name}(役满)')
+        else:
+            res.append(f'{name}({n}番)')
+    if record['dora']:
+        res.append(f'ドラ {record["dora"]}')
+    return res
+
+
+def render(record):
+    """记录 -> 与ScoreCalculator._result相同的dict，另含'combination'"""
+    is_hu = bool(record['flags'] & IS_HU)
+    level = int(record['level'])
+    score = int(record['score'])
+    if level == YAKU_MAN and score > 8000:
+        level = f'{score // 8000}倍役满'
+    else:
+        level = SCORE_LEVELS.get(level)
+    combination = int(record['combination'])
+    return {
+        'fu': int(record['fu']) if is_hu else None,
+        'han': int(record['han']) if is_hu else None,
+        'level': level,
+        'score': score if is_hu else None,
+        'points': int(record['points']),
+        'yaku_list': yaku_list(record) if is_hu else None,
+        'has_yaku': bool(record['flags'] & HAS_YAKU),
+        'combination': None if combination == NO_COMBINATION else combination
+    }
@@ -0,0 +1,224 @@
+"""
+天凤牌谱（mjlog XML）的流式读取
+
+以iterparse逐个标签处理摸牌、切牌、副露、立直、和了事件，处理完即清除元素，内存占用与牌谱大小无关。
+每次和了产生一组ScoreCalculator.update的参数(tiles, hu_tile, {其余参数})，可直接交给ResultCache.score_many
+或工作进程（均为可pickle的str、int、bool）。其中一发、海底河底、岭上开花、抢杠、天和地和人和只能由牌谱的
+事件顺序确定；手牌、和了牌、宝牌指示牌取自AGARI标签。
+
+天凤格式要点:
+    牌为0-135，// 4得到种类（0-8万、9-17饼、18-26索、27-33东南西北白发中），16、52、88为赤五
+    <GO type> 规则（0x02: 无赤，0x10: 三麻）
+    <INIT seed="局,本场,供托,骰子,骰子,宝牌指示牌" oya hai0..hai3> 开局
+    <T52/>等: 摸牌（T、U、V、W对应0-3号玩家），<D52/>等: 切牌（D、E、F、G）
+    <N who m> 副露（m为面子编码），<REACH who step> 立直宣言(1)与成立(2)，<DORA hai> 新宝牌指示牌
+    <AGARI who fromWho hai m machi doraHai doraHaiUra ...> 和了，<RYUUKYOKU> 流局
+用法:
+    for tiles, hu_tile, kwargs in read_wins('2023010100gm-00a9-0000-xxxxxxxx.mjlog'):
+        calculator.update(tiles, hu_tile, **kwargs)
+"""
+import gzip
+import re
+import xml.etree.ElementTree as ET
+from contextlib import nullcontext
+
+from mahjong.checker import Mahjong
+
+DRAW_TAG = re.compile(r'^([TUVW])(\d+)$')
+DISCARD_TAG = re.compile(r'^([DEFG])(\d+)$')
+RED_FIVES = {16: -1, 52: 9, 88: 19}
+
+_checker = Mahjong()
+
+
+def tile_id(tile, aka=True):
+    """天凤的牌(0-135) -> 牌id，aka为True时16、52、88为赤宝牌"""
+    if aka and tile in RED_FIVES:
+        return RED_FIVES[tile]
+    kind = tile // 4
+    if kind >= 27:
+        return (kind - 24) * 10
+    return kind // 9 * 10 + kind % 9
+
+
+def decode_meld(m):
+    """
+    天凤的面子编码 -> (种类, 天凤的牌的list)
+    种类: 'chi'、'pon'、'added_kong'（加杠）、'kong'（大明杠）、'concealed_kong'、'north'（拔北）
+    """
+    if m & 0x4:
+        t = (m >> 10) // 3
+        base = t // 7 * 9 + t % 7
+        return 'chi', [(base + i) * 4 + (m >> (3 + 2 * i) & 3) for i in range(3)]
+    if m & 0x18:
+        t = (m >> 9) // 3
+        unused = m >> 5 & 3
+        tiles = [t * 4 + i for i in range(4)]
+        if m & 0x8:
+            return 'pon', [tile for i, tile in enumerate(tiles) if i != unused]
+        return 'added_kong', tiles
+    if m & 0x20:
+        return 'north', [m >> 8]
+    base = (m >> 8) // 4 * 4
+    return 'kong' if m & 3 else 'concealed_kong', [base + i for i in range(4)]
+
+
+def _ints(value):
+    return [int(_) for _ in value.split(',')] if value else []
+
+
+def _agari_args(attrib, aka):
+    """AGARI标签 -> (tiles, hu_tile, north_dora)"""
+    machi = int(attrib['machi'])
+    hand = _ints(attrib['hai'])
+    hand.remove(machi)
+    called = []
+    north_dora = 0
+    for m in _ints(attrib.get('m')):
+        kind, tiles = decode_meld(m)
+        if kind == 'north':
+            north_dora += 1
+            continue
+        ids = [tile_id(_, aka) for _ in tiles]
+        if kind == 'concealed_kong':
+            """暗杠写作5张，第5张为普通牌（赤宝牌按4张中的实际张数计）"""
+            ids.append(tile_id(tiles[-1], False))
+        called.append(_checker.id2str(ids))
+    tiles = ' '.join([_checker.id2str([tile_id(_, aka) for _ in hand]), *called])
+    return tiles, _checker.id2str([tile_id(machi, aka)]), north_dora
+
+
+class Round:
+    """一局中判断情景参数所需的状态"""
+
+    def __init__(self, attrib, players):
+        seed = _ints(attrib['seed'])
+        self.round, self.honba = seed[0], seed[1]
+        self.players = players
+        self.oya = int(attrib['oya'])
+        self.draws_left = (136 if players == 4 else 108) - 14 - 13 * players
+        self.lichi = [0] * players
+        self.ippatsu = [False] * players
+        self.first_turn = [True] * players
+        self.called = False
+        self.after_kong = False
+        self.last_meld = None
+
+    def draw(self, who):
+        """岭上摸牌也计入摸牌数"""
+        self.draws_left -= 1
+        self.last_meld = None
+
+    def discard(self, who):
+        self.first_turn[who] = False
+        self.ippatsu[who] = False
+        self.after_kong = False
+        self.last_meld = None
+
+    def meld(self, who, kind):
+        """副露（含暗杠、拔北）打断一发，拔北以外的副露打断第一巡"""
+        self.ippatsu = [False] * self.players
+        if kind != 'north':
+            self.called = True
+            self.first_turn = [False] * self.players
+        self.after_kong = kind in ('added_kong', 'kong', 'concealed_kong')
+        self.last_meld = kind
+
+    def reach(self, who, step):
+        if step == 1:
+            self.lichi[who] = 2 if self.first_turn[who] and not self.called else 1
+        elif step == 2:
+            """宣言牌切出后成立，下一次切牌前和了为一发"""
+            self.ippatsu[who] = True
+
+    def win(self, attrib, aka):
+        who, from_who = int(attrib['who']), int(attrib['fromWho'])
+        is_self_draw = who == from_who
+        is_dealer = who == self.oya
+        tiles, hu_tile, north_dora = _agari_args(attrib, aka)
+        lichi = self.lichi[who]
+        no_call = self.first_turn[who] and not self.called
+        return tiles, hu_tile, {
+            'prevailing_wind': self.round // 4 + 1,
+            'dealer_wind': (who - self.oya) % self.players + 1,
+            'is_self_draw': is_self_draw,
+            'lichi': lichi,
+            'dora': _checker.id2str([tile_id(_, aka) for _ in _ints(attrib.get('doraHai'))]),
+            'ura_dora': _checker.id2str([tile_id(_, aka) for _ in _ints(attrib.get('doraHaiUra'))]) if lichi else '',
+            'north_dora': north_dora,
+            'ippatsu': bool(lichi and self.ippatsu[who]),
+            'is_under_the_sea': self.draws_left == 0 and self.last_meld is None and not self.after_kong,
+            'is_after_a_kong': is_self_draw and self.after_kong,
+            'is_robbing_the_kong': not is_self_draw and self.last_meld in ('added_kong', 'concealed_kong'),
+            'is_blessing_of_heaven': is_self_draw and is_dealer and no_call,
+            'is_blessing_of_earth': is_self_draw and not is_dealer and no_call,
+            'is_blessing_of_man': not is_self_draw and not is_dealer and no_call
+        }
+
+
+def _open(source):
+    """.gz路径以gzip打开，其余原样交给iterparse（路径由iterparse打开并关闭，文件对象由调用方关闭）"""
+    if isinstance(source, str) and source.endswith('.gz'):
+        return gzip.open(source, 'rb')
+    return nullcontext(source)
+
+
+def read_wins(source, with_meta=False):
+    """
+    逐个产生牌谱中的和了
+    :param source: 牌谱路径（.gz为gzip压缩）或二进制文件对象
+    :param with_meta: 为True时另外产生{'round', 'honba', 'who', 'from_who', 'ten'}
+    :return: 生成器，产生(tiles, hu_tile, {update的其余参数})，with_meta时末尾附加meta
+    """
+    aka = True
+    players = 4
+    current = None
+    root = None
+    with _open(source) as file:
+        for event, elem in ET.iterparse(file, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                continue
+            tag, attrib = elem.tag, elem.attrib
+            if tag == 'GO':
+                rule = int(attrib.get('type', 0))
+                aka = not rule & 0x02
+                players = 3 if rule & 0x10 else 4
+            elif tag == 'INIT':
+                current = Round(attrib, players)
+            elif current is not None:
+                if DRAW_TAG.match(tag):
+                    current.draw('TUVW'.index(tag[0]))
+                elif DISCARD_TAG.match(tag):
+                    current.discard('DEFG'.index(tag[0]))
+                elif tag == 'N':
+                    current.meld(int(attrib['who']), decode_meld(int(attrib['m']))[0])
+                elif tag == 'REACH':
+                    current.reach(int(attrib['who']), int(attrib['step']))
+                elif tag == 'AGARI':
+                    tiles, hu_tile, kwargs = current.win(attrib, aka)
+                    if with_meta:
+                        meta = {
+                            'round': current.round, 'honba': current.honba, 'who': int(attrib['who']),
+                            'from_who': int(attrib['fromWho']), 'ten': _ints(attrib.get('ten'))
+                        }
+                        yield tiles, hu_tile, kwargs, meta
+                    else:
+                        yield tiles, hu_tile, kwargs
+            root.clear()
+
+
+def read_many(sources, with_meta=False):
+    """依次读取多个牌谱"""
+    for source in sources:
+        yield from read_wins(source, with_meta)
+
+
+if __name__ == '__main__':
+    import sys
+    from mahjong.score import ScoreCalculator
+    calculator = ScoreCalculator()
+    for tiles, hu_tile, kwargs in read_many(sys.argv[1:]):
+        calculator.update(tiles, hu_tile, **kwargs)
+        print(tiles, hu_tile, calculator.yaku_list, calculator.score)
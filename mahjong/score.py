@@ -1,3 +1,6 @@
+from functools import lru_cache
+from itertools import product
+
 from mahjong.checker import *
 import numpy as np
 import math
@@ -20,16 +23,161 @@ SCORE_LEVELS = {
 }
 
 
+def total_points(score, is_dealer, is_self_draw):
+    """由基本点计算和了者所得点数（不含本场、供托）"""
+    def ceil100(x):
+        return math.ceil(x / 100) * 100
+    if is_dealer:
+        return 3 * ceil100(2 * score) if is_self_draw else ceil100(6 * score)
+    if is_self_draw:
+        return ceil100(2 * score) + 2 * ceil100(score)
+    return ceil100(4 * score)
+
+
+"""
+役种判断的门槛条件：由牌集掩码、副露数等即可得出的必要条件，不成立时对应的判断必为0
+"""
+FACTS = {
+    'closed': lambda c: not c._has_furu,
+    'concealed': lambda c: c._is_concealed_hand,
+    'three_calls': lambda c: len(c.called_tiles) >= 3,
+    'four_calls': lambda c: len(c.called_tiles) == 4,
+    'honors': lambda c: bool(c._tiles_mask & HONORS_MASK),
+    'no_honors': lambda c: not c._tiles_mask & HONORS_MASK,
+    'terminals': lambda c: bool(c._tiles_mask & TERMINALS_MASK),
+    'suited': lambda c: bool(c._tiles_mask & ~HONORS_MASK),
+    'dragons': lambda c: c._tiles_mask & DRAGONS_MASK == DRAGONS_MASK,
+    'winds': lambda c: c._tiles_mask & WINDS_MASK == WINDS_MASK,
+    'value_tiles': lambda c: bool(
+        c._tiles_mask & (DRAGONS_MASK | TILE_BITS[c._prevailing_wind] | TILE_BITS[c._dealer_wind])
+    ),
+    'no_simples': lambda c: not c._tiles_mask & ~TERMINALS_HONORS_MASK,
+    'honors_only': lambda c: not c._tiles_mask & ~HONORS_MASK,
+    'terminals_only': lambda c: not c._tiles_mask & ~TERMINALS_MASK,
+    'greens_only': lambda c: not c._tiles_mask & ~GREENS_MASK,
+    'one_suit': lambda c: any(not c._tiles_mask & ~HONORS_MASK & ~mask for mask in (MANS_MASK, PINS_MASK, SOUS_MASK)),
+    'three_suits': lambda c: all(c._tiles_mask & mask for mask in (MANS_MASK, PINS_MASK, SOUS_MASK)),
+    'full_suit': lambda c: any(c._tiles_mask & mask == mask for mask in (MANS_MASK, PINS_MASK, SOUS_MASK))
+}
+
+"""役满: (判断函数, 役满名, 2倍役满名, 门槛条件, 是否古役)，按此顺序输出"""
+YAKUMAN_RULES = [
+    ('blessing_of_heaven', '天和', '天和', (), False),
+    ('blessing_of_earth', '地和', '地和', (), False),
+    ('blessing_of_man', '人和', '人和', (), True),
+    ('three_years_on_stone', '石上三年', '石上三年', (), True),
+    ('four_kongs', '四杠子', '四杠子', ('four_calls',), False),
+    ('big_three_dragons', '大三元', '大三元', ('dragons',), False),
+    ('all_green', '绿一色', '绿一色', ('greens_only',), False),
+    ('all_honors', '字一色', '字一色', ('honors_only',), False),
+    ('four_winds', '小四喜', '大四喜', ('winds',), False),
+    ('all_terminals', '清老头', '清老头', ('terminals_only',), False),
+    ('four_concealed_triplets', '四暗刻', '四暗刻单骑', ('concealed',), False),
+    ('thirteen_orphans', '国士无双', '国士无双十三面', ('closed', 'no_simples'), False),
+    ('nine_gates', '九莲宝灯', '纯正九莲宝灯', ('closed', 'no_honors', 'one_suit'), False),
+    ('big_seven_stars', '大七星', '大七星', ('closed', 'honors_only'), True),
+    ('big_wheels', '大车轮', '大车轮', ('closed', 'no_honors', 'one_suit'), True),
+    ('big_bamboos', '大竹林', '大竹林', ('closed', 'no_honors', 'one_suit'), True),
+    ('big_numbers', '大数邻', '大数邻', ('closed', 'no_honors', 'one_suit'), True)
+]
+
+"""
+一般役: (判断函数, 是否逐个拆分判断, 役名, 门槛条件, 是否古役)，按此顺序输出
+三色同刻按牌编号间隔10判断，字牌刻子也可能满足，故不设门槛
+"""
+REGULAR_RULES = [
+    ('sequence_hand', True, lambda n: '平和(1番)', ('closed',), False),
+    ('seven_pairs', True, lambda n: '七对子(2番)', ('closed',), False),
+    ('pure_double_chows', True, lambda n: '二杯口(3番)' if n == 3 else '一杯口(1番)', ('closed',), False),
+    ('all_simple', False, lambda n: '断幺九(1番)', (), False),
+    ('value_tiles', False, lambda n: f'役牌({n}番)', ('value_tiles',), False),
+    ('all_pungs', True, lambda n: '对对和(2番)', (), False),
+    ('three_kongs', False, lambda n: '三杠子(2番)', ('three_calls',), False),
+    ('small_three_dragons', False, lambda n: '小三元(2番)', ('dragons',), False),
+    ('three_concealed_triplets', True, lambda n: '三暗刻(2番)', (), False),
+    ('pure_straight', True, lambda n: f'一气通贯({n}番)', ('full_suit',), False),
+    ('all_mixed_terminals', False, lambda n: '混老头(2番)', ('honors', 'no_simples'), False),
+    ('mixed_outside_hand', True, lambda n: f'混全带幺九({n}番)', ('honors', 'terminals'), False),
+    ('mixed_triple_chow', True, lambda n: f'三色同顺({n}番)', ('three_suits',), False),
+    ('triple_pungs', True, lambda n: '三色同刻(2番)', (), False),
+    ('outside_hand', True, lambda n: f'纯全带幺九({n}番)', ('no_honors', 'terminals'), False),
+    ('three_identical_sequences', True, lambda n: f'一色三同顺({n}番)', ('suited',), True),
+    ('all_types', False, lambda n: '五门齐(2番)', ('three_suits', 'honors'), True),
+    ('three_consecutive_triplets', True, lambda n: '三连刻(2番)', ('suited',), True),
+    ('shiiaruraotai', False, lambda n: '十二落抬(1番)', ('four_calls',), True),
+    ('pure_hand', False, lambda n: f'混一色({n}番)' if n <= 3 else f'清一色({n}番)', ('one_suit',), False)
+]
+
+
+class EvaluationPlan:
+    """
+    按规则编译的役种判断计划：
+    去掉规则外的役种，并将门槛条件相同的判断归为一组，门槛不成立时整组跳过；
+    门槛为空的组排在最前，其余按组内第一个役种的顺序排列，输出时恢复原顺序
+    """
+
+    def __init__(self, use_ancient_yaku=False, double_yakuman=True):
+        """
+        :param use_ancient_yaku: 是否使用古役
+        :param double_yakuman: 是否计2倍役满（为False时大四喜、四暗刻单骑等只计1倍役满）
+        """
+        self.use_ancient_yaku = use_ancient_yaku
+        self.double_yakuman = double_yakuman
+        self.yakuman = self._compile(YAKUMAN_RULES)
+        self.regular = self._compile(REGULAR_RULES)
+        self.regular_count = sum(len(rules) for _, rules in self.regular)
+
+    def _compile(self, rules):
+        groups = {}
+        for index, (name, *rest, gate, ancient) in enumerate(rules):
+            if ancient and not self.use_ancient_yaku:
+                continue
+            groups.setdefault(gate, []).append((index, name, *rest))
+        return sorted(groups.items(), key=lambda x: (len(x[0]) > 0, x[1][0][0]))
+
+
+"""
+只与牌形及是否自摸有关的判断函数，情景表计算（ScoreCalculator.scenario_grid）中各情景共用其结果；
+四暗刻、国士无双、九莲宝灯、石上三年等读取其余情景条件或有副作用，不在此列
+"""
+SHAPE_PREDICATES = {
+    *(rule[0] for rule in REGULAR_RULES),
+    'four_kongs', 'big_three_dragons', 'all_green', 'all_honors', 'four_winds', 'all_terminals', 'big_seven_stars',
+    'big_wheels', 'big_bamboos', 'big_numbers', 'concealed_hand_self_drawn', 'fussu'
+}
+
+"""情景表默认的情景条件及取值"""
+DEFAULT_SCENARIOS = {
+    'is_self_draw': [False, True],
+    'lichi': [0, 1, 2],
+    'ippatsu': [False, True],
+    'is_under_the_sea': [False, True],
+    'is_after_a_kong': [False, True]
+}
+SCENARIO_FLAGS = {*DEFAULT_SCENARIOS, 'is_robbing_the_kong', 'tsubamegaeshi', 'kanfuri'}
+
+
+@lru_cache(maxsize=None)
+def evaluation_plan(use_ancient_yaku=False, double_yakuman=True):
+    """每种规则只编译一次"""
+    return EvaluationPlan(use_ancient_yaku, double_yakuman)
+
+
 class ScoreCalculator:
     """以下判断以和了型为前提条件"""
 
+    """性能分析器（见mahjong.profiling），不随__init__重置"""
+    profiler = None
+    """情景表计算中各情景共用的判断结果，不随__init__重置"""
+    _shape_values = None
+
     def __init__(self):
         self.tiles_str = ''
         self.checker = Mahjong()
         self._hand_counter = None
         self._counter = None
         self._tiles = []
-        self._tiles_set = set()
+        self._tiles_mask = 0
         self._has_furu = False
         self._is_concealed_hand = False
         self._kuisagari = 0
@@ -56,13 +204,19 @@ class ScoreCalculator:
         self._is_thirteen_orphans = False
         self.is_hu = False
         self.combinations = []
+        """与combinations、called_tiles一一对应的Meld"""
+        self.melds = []
+        self.called_melds = []
         self.max_score_index = None
 
         self._use_ancient_yaku = False
         self._is_blessing_of_man = False
         self._tsubamegaeshi = False
         self._kanfuri = False
+        self._double_yakuman = True
 
+        self._facts = {}
+        self.skipped_predicates = 0
         self.fu = self.yaku_list = self.number = self.level = self.score = None
 
     def update(
@@ -85,7 +239,8 @@ class ScoreCalculator:
             use_ancient_yaku=False,
             is_blessing_of_man=False,
             tsubamegaeshi=False,
-            kanfuri=False
+            kanfuri=False,
+            double_yakuman=True
     ):
         """
         万子:0-9m
@@ -113,12 +268,59 @@ class ScoreCalculator:
         :param is_blessing_of_man: 是否为人和(非「子家无副露荣和」时,此参数无效)
         :param tsubamegaeshi: 是否触发燕返（use_ancient_yaku为True时有效）
         :param kanfuri: 是否杠振（use_ancient_yaku为True时有效）
+        :param double_yakuman: 是否计2倍役满（大四喜、四暗刻单骑、国士无双十三面、纯正九莲宝灯、大七星）
         """
         self.__init__()
+        self._profile('start')
+        hu_tile = self.checker.str2id(hu_tile)[0][0]
+        hand_tiles, called_tiles = self.checker.str2id(tiles)
+        self._profile('parse')
+        self._update(
+            tiles, hand_tiles, called_tiles, hu_tile, None, prevailing_wind, dealer_wind, is_self_draw, lichi, dora,
+            ura_dora, north_dora, ippatsu, is_under_the_sea, is_after_a_kong, is_robbing_the_kong,
+            is_blessing_of_heaven, is_blessing_of_earth, use_ancient_yaku, is_blessing_of_man, tsubamegaeshi, kanfuri,
+            double_yakuman
+        )
+        self._profile('end')
+
+    def _profile(self, stage):
+        """标记一个阶段结束（未启用性能分析时几乎无开销）"""
+        if self.profiler is not None:
+            self.profiler.mark(self, stage)
+
+    def _update(
+            self,
+            tiles: str,
+            hand_tiles: List[int],
+            called_tiles: List[List[int]],
+            hu_tile: int,
+            combinations,
+            prevailing_wind,
+            dealer_wind,
+            is_self_draw,
+            lichi,
+            dora,
+            ura_dora,
+            north_dora=0,
+            ippatsu=False,
+            is_under_the_sea=False,
+            is_after_a_kong=False,
+            is_robbing_the_kong=False,
+            is_blessing_of_heaven=False,
+            is_blessing_of_earth=False,
+            use_ancient_yaku=False,
+            is_blessing_of_man=False,
+            tsubamegaeshi=False,
+            kanfuri=False,
+            double_yakuman=True
+    ):
+        """
+        update的id版本，hand_tiles不含和了牌
+        :param combinations: 已知的手牌拆分（与search_combinations结果相同），为None时重新搜索
+        """
         self.tiles_str = tiles
-        self.hu_tile, _ = self.checker.str2id(hu_tile)
-        self.hu_tile = self.hu_tile[0]
-        self.hand_tiles, self.called_tiles = self.checker.str2id(self.tiles_str)
+        self.hu_tile = hu_tile
+        self.hand_tiles, self.called_tiles = hand_tiles, called_tiles
         self.hand_tiles.append(self.hu_tile)
 
         self.hand_aka_dora = [self.hand_tiles.count(_) for _ in [AKA_MAN, AKA_PIN, AKA_SOU]]
@@ -142,7 +344,7 @@ class ScoreCalculator:
             return
         if not 18 >= len(self._tiles) >= 14:
             return
-        self._tiles_set = set(self._tiles)
+        self._tiles_mask = tiles_mask(self._counter)
         self._has_furu = bool(self.called_tiles)
         self._is_concealed_hand = not self._has_furu or all(self.checker.is_concealed_kong(_) for _ in self.called_tiles)
         self._kuisagari = 1 - self._is_concealed_hand
@@ -164,7 +366,13 @@ class ScoreCalculator:
         self._is_blessing_of_heaven = is_blessing_of_heaven and dealer_wind == 1 and is_self_draw and not self._has_furu
         self._is_blessing_of_earth = is_blessing_of_earth and dealer_wind != 1 and is_self_draw and not self._has_furu
 
-        self.combinations = list(self.checker.search_combinations(self.hand_tiles, len(self.called_tiles)))
+        self._profile('counters')
+        if combinations is None:
+            combinations = self.checker.search_combinations(self.hand_tiles, len(self.called_tiles))
+        self.combinations = list(combinations)
+        self._profile('search_combinations')
+        self.melds = [[to_meld(tiles, self.hu_tile) for tiles in combination] for combination in self.combinations]
+        self.called_melds = [to_meld(tuple(meld), is_called=True) for meld in self.called_tiles]
         if not self.combinations and not self._has_furu:
             self._is_thirteen_orphans = self.thirteen_orphans()
         else:
@@ -174,8 +382,10 @@ class ScoreCalculator:
         self._is_blessing_of_man = is_blessing_of_man and not is_self_draw and dealer_wind != 1 and not self._has_furu
         self._tsubamegaeshi = tsubamegaeshi and not self._is_self_draw
         self._kanfuri = kanfuri and not self._is_self_draw
+        self._double_yakuman = double_yakuman
         if self.is_hu:
             self.fu, self.yaku_list, self.number, self.level, self.score = self.calculate()
+            self._profile('calculate')
 
         if self.level == YAKU_MAN and self.score > 8000:
             number = self.score // 8000
@@ -183,6 +393,92 @@ class ScoreCalculator:
         else:
             self.level = SCORE_LEVELS.get(self.level)
 
+    def tenpai_value(self, tiles: str, prevailing_wind, dealer_wind, lichi, dora, ura_dora, **context):
+        """
+        听牌估值: 对13张手牌的每一种听牌，分别计算荣和与自摸时的符数、番数、基本点与得点。
+        13张手牌只解析、拆分一次，听牌及各听牌的和了型拆分均由部分拆分补全得到。
+        调用后计算器保存最后一种情形的结果
+        :param tiles: 13张手牌字符串，若有副露则以空格隔离
+        :param context: 传给update的其余参数（不含hu_tile与is_self_draw）
+        :return: {听牌字符串: {'ron': 结果, 'tsumo': 结果}}
+        """
+        hand_tiles, called_tiles = self.checker.str2id(tiles)
+        normalized_hand = list(sorted(map(lambda x: x + 5 if x in AKA_DORA else x, hand_tiles)))
+        normalized_called = [list(sorted(map(lambda x: x + 5 if x in AKA_DORA else x, _))) for _ in called_tiles]
+        if not self.checker.check_called_tiles(normalized_called):
+            return {}
+        partial = self.checker.search_partial_combinations(normalized_hand, len(normalized_called))
+        waits = self.checker.thirteen_orphans_wait(normalized_hand, normalized_called)
+        if waits is None:
+            total_counter = Counter(normalized_hand + sum(normalized_called, []))
+            waits = set(tile for tile in partial if total_counter[tile] < 4)
+        is_dealer = dealer_wind == 1
+        res = {}
+        for tile in sorted(waits):
+            res[self.checker.id2str([tile])] = value = {}
+            for name, is_self_draw in [('ron', False), ('tsumo', True)]:
+                self.__init__()
+                self._profile('start')
+                self._update(
+                    tiles, list(hand_tiles), [list(_) for _ in called_tiles], tile, partial.get(tile, set()),
+                    prevailing_wind, dealer_wind, is_self_draw, lichi, dora, ura_dora, **context
+                )
+                self._profile('end')
+                value[name] = self._result(is_dealer, is_self_draw)
+        return res
+
+    def scenario_grid(self, tiles: str, hu_tile: str, prevailing_wind, dealer_wind, dora, ura_dora, scenarios=None, **context):
+        """
+        情景表: 对同一手和了牌，计算情景条件（荣和/自摸、立直/两立直、一发、海底河底、岭上开花等）各种组合下的结果。
+        手牌只解析、拆分一次，与情景无关的役种判断及符数（按荣和/自摸）在各情景间共用。
+        调用后计算器保存最后一种情景的结果
+        :param tiles: 手牌字符串（不含和了牌），同update
+        :param scenarios: {情景条件: 取值列表}，条件须在SCENARIO_FLAGS中，默认为DEFAULT_SCENARIOS
+        :param context: 传给update的其余参数
+        :return: [{**情景条件, 'fu', 'han', 'level', 'score', 'points', 'yaku_list', 'has_yaku'}]，按scenarios的笛卡尔积顺序
+        """
+        if scenarios is None:
+            scenarios = DEFAULT_SCENARIOS
+        if any(flag not in SCENARIO_FLAGS or flag in context for flag in scenarios):
+            raise ValueError('Wrong scenario flags!')
+        hu_tile = self.checker.str2id(hu_tile)[0][0]
+        hand_tiles, called_tiles = self.checker.str2id(tiles)
+        is_dealer = dealer_wind == 1
+        combinations = None
+        rows = []
+        self._shape_values = {}
+        try:
+            for values in product(*scenarios.values()):
+                scenario = dict(zip(scenarios, values))
+                kwargs = {**context, **scenario}
+                is_self_draw = kwargs.pop('is_self_draw', False)
+                lichi = kwargs.pop('lichi', 0)
+                self.__init__()
+                self._profile('start')
+                self._update(
+                    tiles, list(hand_tiles), [list(_) for _ in called_tiles], hu_tile, combinations,
+                    prevailing_wind, dealer_wind, is_self_draw, lichi, dora, ura_dora, **kwargs
+                )
+                self._profile('end')
+                combinations = self.combinations
+                rows.append({**scenario, **self._result(is_dealer, is_self_draw)})
+        finally:
+            self.__dict__.pop('_shape_values', None)
+        return rows
+
+    def _result(self, is_dealer, is_self_draw):
+        """当前结果的摘要"""
+        is_win = self.is_hu and self.has_yaku
+        return {
+            'fu': int(self.fu) if self.is_hu else None,
+            'han': self.number,
+            'level': self.level,
+            'score': self.score,
+            'points': total_points(self.score, is_dealer, is_self_draw) if is_win else 0,
+            'yaku_list': self.yaku_list,
+            'has_yaku': self.has_yaku
+        }
+
     def hand_unicode(self):
         return ''.join(ID2UNICODE[_] for _ in self.hand_tiles)
 
@@ -218,28 +514,26 @@ class ScoreCalculator:
             s += '\n没有和'
         return s
 
-    def _is_sequence_hand(self, combination):
+    def _is_sequence_hand(self, melds):
         """判断某一种组合是否满足平和(可非门清)"""
         two_sided_wait = False
-        for tiles in combination:
-            if self.checker.is_triplet(tiles):
+        for meld in melds:
+            if meld.kind == TRIPLET:
                 return 0
-            if self.checker.is_pair(tiles):
-                if tiles[0] in DRAGONS or tiles[0] == self._dealer_wind or tiles[0] == self._prevailing_wind:
+            if meld.kind == PAIR:
+                if meld.first in DRAGONS or meld.first == self._dealer_wind or meld.first == self._prevailing_wind:
                     return 0
-            if self.checker.is_seq(tiles):
-                if (self.hu_tile == tiles[0] and tiles[2] not in NINES) \
-                        or (self.hu_tile == tiles[-1] and tiles[0] not in ONES):
-                    two_sided_wait = True
+            if meld.is_two_sided:
+                two_sided_wait = True
         if two_sided_wait:
             return 1
         return 0
 
-    def _is_seven_pairs(self, combination):
+    def _is_seven_pairs(self, melds):
         """判断某一种组合是否满足七对子"""
-        if len(combination) != 7:
+        if len(melds) != 7:
             return 0
-        if all(self.checker.is_pair(tiles) for tiles in combination):
+        if all(meld.kind == PAIR for meld in melds):
             return 2
         return 0
 
@@ -247,7 +541,7 @@ class ScoreCalculator:
 
     def all_simple(self):
         """断幺九"""
-        if self._tiles_set.isdisjoint(TERMINALS_HONORS):
+        if not self._tiles_mask & TERMINALS_HONORS_MASK:
             return 1
         return 0
 
@@ -260,17 +554,16 @@ class ScoreCalculator:
     def value_tiles(self):
         """役牌"""
         n = 0
-        for called_tile in self.called_tiles:
-            if called_tile[0] in DRAGONS:
+        for meld in self.called_melds:
+            if meld.first in DRAGONS:
                 n += 1
-            if called_tile[0] == self._prevailing_wind:
+            if meld.first == self._prevailing_wind:
                 n += 1
-            if called_tile[0] == self._dealer_wind:
+            if meld.first == self._dealer_wind:
                 n += 1
-        combination = self.combinations[0]
-        for tiles in combination:
-            if self.checker.is_triplet(tiles):
-                tile = tiles[0]
+        for meld in self.melds[0]:
+            if meld.kind == TRIPLET:
+                tile = meld.first
                 if tile in DRAGONS:
                     n += 1
                 if tile == self._prevailing_wind:
@@ -284,18 +577,18 @@ class ScoreCalculator:
         if self._has_furu:
             return np.array([0])
         values = []
-        for combination in self.combinations:
-            if len(combination) != 5:
+        for melds in self.melds:
+            if len(melds) != 5:
                 values.append(0)
                 continue
-            value = self._is_sequence_hand(combination)
+            value = self._is_sequence_hand(melds)
             values.append(value)
         return np.array(values)
 
     def shiiaruraotai(self):
         """古役 十二落抬"""
-        if len(self.called_tiles) == 4:
-            if all(not self.checker.is_concealed_kong(_) for _ in self.called_tiles):
+        if len(self.called_melds) == 4:
+            if all(not meld.is_concealed for meld in self.called_melds):
                 return 1
         return 0
 
@@ -306,16 +599,16 @@ class ScoreCalculator:
         if self._has_furu:
             return np.array([0])
         values = []
-        for combination in self.combinations:
-            values.append(self._is_seven_pairs(combination))
+        for melds in self.melds:
+            values.append(self._is_seven_pairs(melds))
         return np.array(values)
 
     def all_pungs(self):
         """对对和"""
         values = []
-        called_pung_count = sum(map(lambda x: self.checker.is_triplet(x) or self.checker.is_kong(x), self.called_tiles))
-        for combination in self.combinations:
-            s = sum(map(self.checker.is_triplet, combination))
+        called_pung_count = sum(meld.kind in (TRIPLET, KONG) for meld in self.called_melds)
+        for melds in self.melds:
+            s = sum(meld.kind == TRIPLET for meld in melds)
             if s + called_pung_count == 4:
                 values.append(2)
             else:
@@ -324,7 +617,7 @@ class ScoreCalculator:
 
     def three_kongs(self):
         """三杠子"""
-        if sum(self.checker.is_kong(_) for _ in self.called_tiles) == 3:
+        if sum(meld.kind == KONG for meld in self.called_melds) == 3:
             return 2
         return 0
 
@@ -338,12 +631,12 @@ class ScoreCalculator:
     def three_concealed_triplets(self):
         """三暗刻"""
         values = []
-        consealed_kong_count = sum(map(self.checker.is_concealed_kong, self.called_tiles))
-        for combination in self.combinations:
+        consealed_kong_count = sum(meld.is_concealed for meld in self.called_melds)
+        for melds in self.melds:
             s = 0
-            for tiles in combination:
-                if self.checker.is_triplet(tiles):
-                    if self.hu_tile != tiles[0] or self._is_self_draw or self._hand_counter[self.hu_tile] == 4:
+            for meld in melds:
+                if meld.kind == TRIPLET:
+                    if self.hu_tile != meld.first or self._is_self_draw or self._hand_counter[self.hu_tile] == 4:
                         s += 1
             if s + consealed_kong_count == 3:
                 values.append(2)
@@ -354,11 +647,9 @@ class ScoreCalculator:
     def pure_straight(self):
         """一气通贯(副露减一番)"""
         values = []
-        called_seqs = list(filter(self.checker.is_seq, self.called_tiles))
-        called_seq_start_tiles = list(map(lambda x: x[0], called_seqs))
-        for combination in self.combinations:
-            seqs = list(filter(self.checker.is_seq, combination))
-            seq_start_tiles = [_[0] for _ in seqs] + called_seq_start_tiles
+        called_seq_start_tiles = [meld.first for meld in self.called_melds if meld.kind == SEQUENCE]
+        for melds in self.melds:
+            seq_start_tiles = [meld.first for meld in melds if meld.kind == SEQUENCE] + called_seq_start_tiles
             if len(seq_start_tiles) < 3:
                 values.append(0)
                 continue
@@ -373,44 +664,33 @@ class ScoreCalculator:
 
     def all_mixed_terminals(self):
         """混老头"""
-        if self._tiles_set.isdisjoint(HONORS):
+        if not self._tiles_mask & HONORS_MASK:
             return 0
-        if self._tiles_set.issubset(TERMINALS_HONORS) and not self._is_thirteen_orphans:
+        if not self._tiles_mask & ~TERMINALS_HONORS_MASK and not self._is_thirteen_orphans:
             return 2
         return 0
 
     def mixed_outside_hand(self):
         """混全带幺九(副露减一番)"""
-        if self._tiles_set.isdisjoint(HONORS):
+        if not self._tiles_mask & HONORS_MASK:
+            return np.array([0])
+        has_seq = any(meld.kind == SEQUENCE for meld in self.called_melds)
+        if not all(meld.is_outside for meld in self.called_melds):
             return np.array([0])
-        has_seq = any(self.checker.is_seq(_) for _ in self.called_tiles)
-        for called_tile in self.called_tiles:
-            if not called_tile[0] in TERMINALS_HONORS and not called_tile[-1] in TERMINALS_HONORS:
-                return np.array([0])
         values = []
-        for combination in self.combinations:
-            comb_has_seq = has_seq
-            for tiles in combination:
-                if not tiles[0] in TERMINALS_HONORS and not tiles[-1] in TERMINALS_HONORS:
-                    values.append(0)
-                    break
-                if not comb_has_seq:
-                    comb_has_seq = self.checker.is_seq(tiles)
+        for melds in self.melds:
+            if all(meld.is_outside for meld in melds) and (has_seq or any(meld.kind == SEQUENCE for meld in melds)):
+                values.append(2 - self._kuisagari)
             else:
-                if comb_has_seq:
-                    values.append(2 - self._kuisagari)
-                else:
-                    values.append(0)
+                values.append(0)
         return np.array(values)
 
     def mixed_triple_chow(self):
         """三色同顺(副露减一番)"""
         values = []
-        called_seqs = list(filter(self.checker.is_seq, self.called_tiles))
-        called_seq_start_tiles = list(map(lambda x: x[0], called_seqs))
-        for combination in self.combinations:
-            seqs = list(filter(self.checker.is_seq, combination))
-            seq_start_tiles = [_[0] for _ in seqs] + called_seq_start_tiles
+        called_seq_start_tiles = [meld.first for meld in self.called_melds if meld.kind == SEQUENCE]
+        for melds in self.melds:
+            seq_start_tiles = [meld.first for meld in melds if meld.kind == SEQUENCE] + called_seq_start_tiles
             if len(seq_start_tiles) < 3:
                 values.append(0)
                 continue
@@ -426,11 +706,9 @@ class ScoreCalculator:
     def triple_pungs(self):
         """三色同刻"""
         values = []
-        called_triplets = list(filter(lambda x: self.checker.is_triplet(x) or self.checker.is_kong(x), self.called_tiles))
-        called_triplet_ids = list(map(lambda x: x[0], called_triplets))
-        for combination in self.combinations:
-            triplets = list(filter(self.checker.is_triplet, combination))
-            tiles = [_[0] for _ in triplets] + called_triplet_ids
+        called_triplet_ids = [meld.first for meld in self.called_melds if meld.kind in (TRIPLET, KONG)]
+        for melds in self.melds:
+            tiles = [meld.first for meld in melds if meld.kind == TRIPLET] + called_triplet_ids
             if len(tiles) < 3:
                 values.append(0)
                 continue
@@ -445,22 +723,17 @@ class ScoreCalculator:
 
     def all_types(self):
         """古役 五门齐"""
-        if not self._tiles_set.isdisjoint(MANS) \
-            and not self._tiles_set.isdisjoint(PINS) \
-            and not self._tiles_set.isdisjoint(SOUS) \
-            and not self._tiles_set.isdisjoint(WINDS) \
-            and not self._tiles_set.isdisjoint(DRAGONS):
+        mask = self._tiles_mask
+        if mask & MANS_MASK and mask & PINS_MASK and mask & SOUS_MASK and mask & WINDS_MASK and mask & DRAGONS_MASK:
             return 2
         return 0
 
     def three_consecutive_triplets(self):
         """古役 三连刻"""
         values = []
-        called_triplets = list(filter(lambda x: self.checker.is_triplet(x) or self.checker.is_kong(x), self.called_tiles))
-        called_triplet_ids = list(map(lambda x: x[0], called_triplets))
-        for combination in self.combinations:
-            triplets = list(filter(self.checker.is_triplet, combination))
-            tiles = [_[0] for _ in triplets] + called_triplet_ids
+        called_triplet_ids = [meld.first for meld in self.called_melds if meld.kind in (TRIPLET, KONG)]
+        for melds in self.melds:
+            tiles = [meld.first for meld in melds if meld.kind == TRIPLET] + called_triplet_ids
             if len(tiles) < 3:
                 values.append(0)
                 continue
@@ -480,10 +753,8 @@ class ScoreCalculator:
         if self._has_furu:
             return np.array([0])
         values = []
-        for combination in self.combinations:
-            seqs = filter(self.checker.is_seq, combination)
-            seq_start_tiles = [_[0] for _ in seqs]
-            count = Counter(seq_start_tiles)
+        for melds in self.melds:
+            count = Counter(meld.first for meld in melds if meld.kind == SEQUENCE)
             if not count:
                 values.append(0)
             elif list(count.values()) in [[2, 2], [4]]:
@@ -496,27 +767,22 @@ class ScoreCalculator:
 
     def outside_hand(self):
         """纯全带幺九（副露减一番）"""
-        for called_tile in self.called_tiles:
-            if not called_tile[0] in TERMINALS and not called_tile[-1] in TERMINALS:
-                return np.array([0])
+        if not all(meld.is_terminal for meld in self.called_melds):
+            return np.array([0])
         values = []
-        for combination in self.combinations:
-            for tiles in combination:
-                if not tiles[0] in TERMINALS and not tiles[-1] in TERMINALS:
-                    values.append(0)
-                    break
-            else:
+        for melds in self.melds:
+            if all(meld.is_terminal for meld in melds):
                 values.append(3 - self._kuisagari)
+            else:
+                values.append(0)
         return np.array(values)
 
     def three_identical_sequences(self):
         """古役 一色三同顺 （副露减一番）"""
-        called_seq_start_tiles = [_[0] for _ in filter(self.checker.is_seq, self.called_tiles)]
+        called_seq_start_tiles = [meld.first for meld in self.called_melds if meld.kind == SEQUENCE]
         values = []
-        for combination in self.combinations:
-            seqs = filter(self.checker.is_seq, combination)
-            seq_start_tiles = [_[0] for _ in seqs]
-            count = Counter(seq_start_tiles + called_seq_start_tiles)
+        for melds in self.melds:
+            count = Counter([meld.first for meld in melds if meld.kind == SEQUENCE] + called_seq_start_tiles)
             if not count:
                 values.append(0)
             elif any(_ >= 3 for _ in count.values()):
@@ -529,9 +795,9 @@ class ScoreCalculator:
 
     def pure_hand(self):
         """染手，（混一色3番）(副露减一番)"""
-        rm_honor = self._tiles_set.difference(HONORS)
-        if rm_honor.issubset(MANS) or rm_honor.issubset(PINS) or rm_honor.issubset(SOUS):
-            if self._tiles_set.isdisjoint(HONORS):
+        rm_honor = self._tiles_mask & ~HONORS_MASK
+        if not rm_honor & ~MANS_MASK or not rm_honor & ~PINS_MASK or not rm_honor & ~SOUS_MASK:
+            if not self._tiles_mask & HONORS_MASK:
                 return 6 - self._kuisagari
             return 3 - self._kuisagari
         return 0
@@ -556,15 +822,15 @@ class ScoreCalculator:
         """四暗刻、四暗刻单骑（门清限定）"""
         if not self._is_concealed_hand:
             return 0
-        consealed_kong_count = sum(map(self.checker.is_concealed_kong, self.called_tiles))
-        for i, combination in enumerate(self.combinations):
+        consealed_kong_count = sum(meld.is_concealed for meld in self.called_melds)
+        for i, melds in enumerate(self.melds):
             s = 0
             is_tanki = False
-            for tiles in combination:
-                if self.checker.is_triplet(tiles):
-                    if self.hu_tile != tiles[0] or self._is_self_draw:
+            for meld in melds:
+                if meld.kind == TRIPLET:
+                    if self.hu_tile != meld.first or self._is_self_draw:
                         s += 1
-                if self.checker.is_pair(tiles) and self.hu_tile == tiles[0]:
+                if meld.kind == PAIR and meld.has_hu:
                     is_tanki = True
             if s + consealed_kong_count == 4:
                 self.max_score_index = i
@@ -577,7 +843,7 @@ class ScoreCalculator:
         """国士无双（十三面）（门清限定）"""
         if self._has_furu:
             return 0
-        if self._tiles_set == TERMINALS_HONORS and len(self.hand_tiles) == 14:
+        if self._tiles_mask == TERMINALS_HONORS_MASK and len(self.hand_tiles) == 14:
             if self._counter[self.hu_tile] > 1 or self._is_blessing_of_heaven:
                 """国士十三面"""
                 return 26
@@ -586,7 +852,7 @@ class ScoreCalculator:
 
     def four_kongs(self):
         """四杠子"""
-        if sum(self.checker.is_kong(_) for _ in self.called_tiles) == 4:
+        if sum(meld.kind == KONG for meld in self.called_melds) == 4:
             return 13
         return 0
 
@@ -598,13 +864,13 @@ class ScoreCalculator:
 
     def all_green(self):
         """绿一色"""
-        if self._tiles_set.issubset(GREENS):
+        if not self._tiles_mask & ~GREENS_MASK:
             return 13
         return 0
 
     def all_honors(self):
         """字一色"""
-        if self._tiles_set.issubset(HONORS):
+        if not self._tiles_mask & ~HONORS_MASK:
             return 13
         return 0
 
@@ -621,7 +887,7 @@ class ScoreCalculator:
 
     def all_terminals(self):
         """清老头"""
-        if self._tiles_set.issubset(TERMINALS):
+        if not self._tiles_mask & ~TERMINALS_MASK:
             return 13
         return 0
 
@@ -676,6 +942,18 @@ class ScoreCalculator:
             return 13
         return 0
 
+    def blessing_of_heaven(self):
+        """天和"""
+        return 13 if self._is_blessing_of_heaven else 0
+
+    def blessing_of_earth(self):
+        """地和"""
+        return 13 if self._is_blessing_of_earth else 0
+
+    def blessing_of_man(self):
+        """古役 人和"""
+        return 13 if self._is_blessing_of_man else 0
+
     def three_years_on_stone(self):
         """古役 石上三年"""
         if self._lichi == 2 and self._is_under_the_sea:
@@ -692,31 +970,27 @@ class ScoreCalculator:
         if self._is_concealed_hand and not self._is_self_draw:
             fixed_value += 10
 
-        for called_tiles in self.called_tiles:
-            if self.checker.is_triplet(called_tiles):
-                if called_tiles[0] in TERMINALS_HONORS:
-                    fixed_value += 4
-                else:
-                    fixed_value += 2
-            elif self.checker.is_exposed_kong(called_tiles):
-                if called_tiles[0] in TERMINALS_HONORS:
-                    fixed_value += 16
-                else:
-                    fixed_value += 8
-            elif self.checker.is_concealed_kong(called_tiles):
-                if called_tiles[0] in TERMINALS_HONORS:
-                    fixed_value += 32
-                else:
-                    fixed_value += 16
-        for combination in self.combinations:
+        for meld in self.called_melds:
+            if meld.kind == TRIPLET:
+                base = 2
+            elif meld.kind == KONG and not meld.is_concealed:
+                base = 8
+            elif meld.kind == KONG:
+                base = 16
+            else:
+                continue
+            if meld.first in TERMINALS_HONORS:
+                base *= 2
+            fixed_value += base
+        for melds in self.melds:
             value = fixed_value
             wait_form = None
-            if self._is_seven_pairs(combination):
+            if self._is_seven_pairs(melds):
                 """七对子固定为25符"""
                 values.append(25)
                 continue
             if fixed_value == 20:
-                if self._is_sequence_hand(combination):
+                if self._is_sequence_hand(melds):
                     """平和型手牌"""
                     if not self._has_furu:
                         """平和没有其他附加的符"""
@@ -728,33 +1002,31 @@ class ScoreCalculator:
                         continue
             if self._is_self_draw:
                 value += 2
-            for tiles in combination:
-                if self.checker.is_triplet(tiles):
+            for meld in melds:
+                if meld.kind == TRIPLET:
                     exposed_divide = 1
-                    if tiles[0] == self.hu_tile and not self._is_self_draw and self._hand_counter[self.hu_tile] == 3:
+                    if meld.has_hu and not self._is_self_draw and self._hand_counter[self.hu_tile] == 3:
                         exposed_divide = 2
-                    if tiles[0] in TERMINALS_HONORS:
+                    if meld.first in TERMINALS_HONORS:
                         value += 8 / exposed_divide
                     else:
                         value += 4 / exposed_divide
-                if self.checker.is_pair(tiles):
-                    if tiles[0] == self._prevailing_wind:
+                elif meld.kind == PAIR:
+                    if meld.first == self._prevailing_wind:
                         value += 2
-                    if tiles[0] == self._dealer_wind:
+                    if meld.first == self._dealer_wind:
                         value += 2
-                    if tiles[0] in DRAGONS:
+                    if meld.first in DRAGONS:
                         value += 2
-                if wait_form is None:
-                    if self.checker.is_seq(tiles) and self.hu_tile in tiles:
-                        if self.hu_tile == tiles[1]:
+                if wait_form is None and meld.has_hu:
+                    if meld.kind == SEQUENCE:
+                        if self.hu_tile == meld.tiles[1]:
                             value += 2
                             wait_form = 0
-                        else:
-                            if not (self.hu_tile == tiles[0] and tiles[2] not in NINES) \
-                                    and not (self.hu_tile == tiles[-1] and tiles[0] not in ONES):
-                                value += 2
-                                wait_form = 1
-                    if self.checker.is_pair(tiles) and self.hu_tile == tiles[0]:
+                        elif not meld.is_two_sided:
+                            value += 2
+                            wait_form = 1
+                    elif meld.kind == PAIR:
                         value += 2
                         wait_form = 2
             values.append(math.ceil(value / 10) * 10)
@@ -762,107 +1034,61 @@ class ScoreCalculator:
 
     def dora_count(self):
         n = self._north_dora + self._aka_dora
-        f = lambda x: x - 8 if x in NINES else ((x // 10 - 2) % 4 + 3) * 10 if x in WINDS else ((x // 10 - 6) % 3 + 7) * 10 if x in DRAGONS else x + 1
-        dora = map(f, self.dora)
-        counter = copy(self._counter)
-        counter.update([60] * self._north_dora)
-        n += sum(counter[_] for _ in dora)
+        """拔北宝牌计入北的张数"""
+        north = self._north_dora
+        n += sum(self._counter[DORA_NEXT[_]] + north * (DORA_NEXT[_] == 60) for _ in self.dora)
         if self._lichi:
-            ura_dora = map(f, self.ura_dora)
-            n += sum(counter[_] for _ in ura_dora)
+            n += sum(self._counter[DORA_NEXT[_]] + north * (DORA_NEXT[_] == 60) for _ in self.ura_dora)
         return n
 
+    def _evaluate(self, name):
+        """调用判断函数，情景表计算中SHAPE_PREDICATES的结果按是否自摸在各情景间共用"""
+        if self._shape_values is None or name not in SHAPE_PREDICATES:
+            return getattr(self, name)()
+        key = name, self._is_self_draw
+        if key not in self._shape_values:
+            self._shape_values[key] = getattr(self, name)()
+        return self._shape_values[key]
+
+    def _holds(self, gate):
+        """门槛条件是否全部成立，每次calculate中各条件只计算一次"""
+        for name in gate:
+            if name not in self._facts:
+                self._facts[name] = FACTS[name](self)
+            if not self._facts[name]:
+                return False
+        return True
+
     def calculate(self):
         """计算基本点数"""
-        yaku_list: List[str] = []
+        plan = evaluation_plan(self._use_ancient_yaku, self._double_yakuman)
+        self._facts = {}
+        self.skipped_predicates = 0
         full = 0
-        fu = self.fussu()
-        if self._is_blessing_of_heaven:
-            yaku_list.append('天和(役满)')
-            full += 1
-        if self._is_blessing_of_earth:
-            yaku_list.append('地和(役满)')
-            full += 1
-        if self._use_ancient_yaku:
-            if self._is_blessing_of_man:
-                yaku_list.append('人和(役满)')
-                full += 1
-            if self.three_years_on_stone():
-                yaku_list.append('石上三年(役满)')
-                full += 1
-        n = self.four_kongs()
-        if n != 0:
-            yaku_list.append('四杠子(役满)')
-            full += 1
-        n = self.big_three_dragons()
-        if n != 0:
-            yaku_list.append('大三元(役满)')
-            full += 1
-        n = self.all_green()
-        if n != 0:
-            yaku_list.append('绿一色(役满)')
-            full += 1
-        n = self.all_honors()
-        if n != 0:
-            yaku_list.append('字一色(役满)')
-            full += 1
-        n = self.four_winds()
-        if n != 0:
-            if n == 26:
-                yaku_list.append('大四喜(2倍役满)')
-                full += 2
-            else:
-                yaku_list.append('小四喜(役满)')
-                full += 1
-        n = self.all_terminals()
-        if n != 0:
-            yaku_list.append('清老头(役满)')
-            full += 1
-        n = self.four_concealed_triplets()
-        if n != 0:
-            if n == 26:
-                yaku_list.append('四暗刻单骑(2倍役满)')
-                full += 2
-            else:
-                yaku_list.append('四暗刻(役满)')
-                full += 1
-        n = self._is_thirteen_orphans
-        if n != 0:
-            if n == 26:
-                yaku_list.append('国士无双十三面(2倍役满)')
-                full += 2
-            else:
-                yaku_list.append('国士无双(役满)')
-                full += 1
-        n = self.nine_gates()
-        if n != 0:
-            if n == 26:
-                yaku_list.append('纯正九莲宝灯(2倍役满)')
-                full += 2
-            else:
-                yaku_list.append('九莲宝灯(役满)')
-                full += 1
-        if self._use_ancient_yaku:
-            if self.big_seven_stars():
-                n = 26
-                yaku_list.append('大七星(2倍役满)')
-            elif self.big_wheels():
-                n = 13
-                yaku_list.append('大车轮(役满)')
-            elif self.big_bamboos():
-                n = 13
-                yaku_list.append('大竹林(役满)')
-            elif self.big_numbers():
-                n = 13
-                yaku_list.append('大数邻(役满)')
-            else:
-                n = 0
-            full += n // 13
+        fu = self._evaluate('fussu')
+        found = []
+        for gate, rules in plan.yakuman:
+            if not self._holds(gate):
+                self.skipped_predicates += len(rules)
+                continue
+            for index, name, single_name, double_name in rules:
+                n = self._evaluate(name)
+                if n == 0:
+                    continue
+                if n == 26 and plan.double_yakuman:
+                    found.append((index, f'{double_name}(2倍役满)'))
+                    full += 2
+                else:
+                    found.append((index, f'{single_name if n == 13 else double_name}(役满)'))
+                    full += 1
         if full:
+            """已有役满，一般役全部跳过"""
+            self.skipped_predicates += plan.regular_count
             self.has_yaku = True
             fu = np.max(fu)
             if self.max_score_index is None:
                 self.max_score_index = 0
+            yaku_list = [yaku for _, yaku in sorted(found)]
             return fu, yaku_list, 13 * full, YAKU_MAN, full * 8000
         number = np.zeros(shape=len(self.combinations))
         common_yaku_list = []
@@ -894,7 +1120,6 @@ class ScoreCalculator:
             if self._kanfuri:
                 common_yaku_list.append('杠振(1番)')
                 number += 1
-        yaku_list: List[List[str]] = [[] for _ in self.combinations]
         number += self._lichi
         if self._lichi == 1:
             common_yaku_list.append('立直(1番)')
@@ -907,117 +1132,22 @@ class ScoreCalculator:
             common_yaku_list.append('门前清自摸和(1番)')
             number += 1
 
-        values = self.sequence_hand()
-        for i in np.where(values != 0)[0]:
-            yaku_list[i].append('平和(1番)')
-        number += values
-
-        values = self.seven_pairs()
-        for i in np.where(values != 0)[0]:
-            yaku_list[i].append('七对子(2番)')
-        number += values
-
-        values = self.pure_double_chows()
-        for i in np.where(values != 0)[0]:
-            if values[i] == 3:
-                yaku_list[i].append('二杯口(3番)')
-            elif values[i] == 1:
-                yaku_list[i].append('一杯口(1番)')
-        number += values
-
-        n = self.all_simple()
-        if n != 0:
-            common_yaku_list.append('断幺九(1番)')
-        number += n
-
-        n = self.value_tiles()
-        if n != 0:
-            common_yaku_list.append(f'役牌({n}番)')
-        number += n
-
-        values = self.all_pungs()
-        for i in np.where(values != 0)[0]:
-            yaku_list[i].append('对对和(2番)')
-        number += values
-
-        n = self.three_kongs()
-        if n != 0:
-            common_yaku_list.append('三杠子(2番)')
-        number += n
-
-        n = self.small_three_dragons()
-        if n != 0:
-            common_yaku_list.append('小三元(2番)')
-        number += n
-
-        values = self.three_concealed_triplets()
-        for i in np.where(values != 0)[0]:
-            yaku_list[i].append('三暗刻(2番)')
-        number += values
-
-        values = self.pure_straight()
-        n = np.max(values)
-        for i in np.where(values != 0)[0]:
-            yaku_list[i].append(f'一气通贯({n}番)')
-        number += values
-
-        n = self.all_mixed_terminals()
-        if n != 0:
-            common_yaku_list.append('混老头(2番)')
-        number += n
-
-        values = self.mixed_outside_hand()
-        n = np.max(values)
-        for i in np.where(values != 0)[0]:
-            yaku_list[i].append(f'混全带幺九({n}番)')
-        number += values
-
-        values = self.mixed_triple_chow()
-        n = np.max(values)
-        for i in np.where(values != 0)[0]:
-            yaku_list[i].append(f'三色同顺({n}番)')
-        number += values
-
-        values = self.triple_pungs()
-        for i in np.where(values != 0)[0]:
-            yaku_list[i].append('三色同刻(2番)')
-        number += values
-
-        values = self.outside_hand()
-        n = np.max(values)
-        for i in np.where(values != 0)[0]:
-            yaku_list[i].append(f'纯全带幺九({n}番)')
-        number += values
-
-        if self._use_ancient_yaku:
-            values = self.three_identical_sequences()
-            n = np.max(values)
-            for i in np.where(values != 0)[0]:
-                yaku_list[i].append(f'一色三同顺({n}番)')
-            number += values
-
-            n = self.all_types()
-            if n:
-                common_yaku_list.append('五门齐(2番)')
-            number += n
-
-            values = self.three_consecutive_triplets()
-            for i in np.where(values != 0)[0]:
-                yaku_list[i].append('三连刻(2番)')
-            number += values
-
-            n = self.shiiaruraotai()
-            if n:
-                common_yaku_list.append('十二落抬(1番)')
-            number += n
-
-        n = self.pure_hand()
-        if n != 0:
-            if n <= 3:
-                common_yaku_list.append(f'混一色({n}番)')
-            else:
-                common_yaku_list.append(f'清一色({n}番)')
-        number += n
+        common_found = []
+        found = [[] for _ in self.combinations]
+        for gate, rules in plan.regular:
+            if not self._holds(gate):
+                self.skipped_predicates += len(rules)
+                continue
+            for index, name, each, label in rules:
+                values = self._evaluate(name)
+                if each:
+                    for i in np.where(values != 0)[0]:
+                        found[i].append((index, label(values[i])))
+                elif values != 0:
+                    common_found.append((index, label(values)))
+                number += values
+        common_yaku_list.extend(yaku for _, yaku in sorted(common_found))
+        yaku_list: List[List[str]] = [[yaku for _, yaku in sorted(_)] for _ in found]
         dora_count = self.dora_count()
         number += dora_count
         score = fu * 2 ** (number + 2)
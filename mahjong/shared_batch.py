@@ -0,0 +1,234 @@
+"""
+基于共享内存的多进程批量计分、听牌计算
+
+主进程只解析一次手牌，写成定长的张数向量记录（HAND_DTYPE）放入multiprocessing.shared_memory，
+工作进程按名称映射同一块内存，计算其中一段，并把结果直接写入共享的输出数组：
+计分结果为mahjong.record.RECORD_DTYPE记录，听牌结果为34位掩码（第i位为TILE_IDS[i]）。
+每个任务只传递共享内存名称与下标范围，不再逐手pickle字符串与list。
+用法:
+    hands = encode_hands(read_wins('game.mjlog'))   # 或[(tiles, hu_tile, kwargs)]
+    records = score_shared(hands, workers=8)
+    masks = waits_shared(encode_hands([('1112345678999m', None, {})]))
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from mahjong.checker import Mahjong, TILE_IDS, TILE_INDEX, AKA_MAN, AKA_PIN, AKA_SOU, tiles_mask
+from mahjong.generator import TILE_ID_ARRAY
+from mahjong.record import RECORD_DTYPE, from_calculator
+from mahjong.score import ScoreCalculator
+
+AKA_IDS = (AKA_MAN, AKA_PIN, AKA_SOU)
+AKA_INDICES = (4, 13, 22)
+EMPTY = 255
+
+"""副露种类"""
+NO_MELD, CHOW, PUNG, EXPOSED_KONG, CONCEALED_KONG = range(5)
+
+"""update中的真假参数，按位存入flags"""
+FLAGS = (
+    'is_self_draw', 'ippatsu', 'is_under_the_sea', 'is_after_a_kong', 'is_robbing_the_kong', 'is_blessing_of_heaven',
+    'is_blessing_of_earth', 'use_ancient_yaku', 'is_blessing_of_man', 'tsubamegaeshi', 'kanfuri', 'double_yakuman'
+)
+DEFAULT_FLAGS = {'double_yakuman': True}
+
+"""
+手牌记录: 张数向量与赤宝牌位掩码（第s位为第s种花色的赤五），副露为(种类, 最小牌下标, 是否含赤五)，
+宝牌指示牌为下标（EMPTY表示空位），和了牌为EMPTY时只能用于听牌计算
+"""
+HAND_DTYPE = np.dtype([
+    ('hand', 'u1', (34,)),
+    ('aka', 'u1'),
+    ('hu', 'u1'),
+    ('hu_aka', 'u1'),
+    ('melds', 'u1', (4, 3)),
+    ('prevailing_wind', 'u1'),
+    ('dealer_wind', 'u1'),
+    ('lichi', 'u1'),
+    ('north_dora', 'u1'),
+    ('flags', '<u2'),
+    ('dora', 'u1', (5,)),
+    ('ura_dora', 'u1', (5,))
+])
+
+_checker = Mahjong()
+
+
+def _meld_record(meld):
+    """副露的牌id -> (种类, 最小牌下标, 是否含赤五)"""
+    aka = any(tile in AKA_IDS for tile in meld)
+    meld = sorted(tile + 5 if tile in AKA_IDS else tile for tile in meld)
+    if len(meld) == 5:
+        kind = CONCEALED_KONG
+    elif len(meld) == 4:
+        kind = EXPOSED_KONG
+    elif meld[0] == meld[1]:
+        kind = PUNG
+    else:
+        kind = CHOW
+    return kind, TILE_INDEX[meld[0]], aka
+
+
+def _meld_tiles(kind, index, aka):
+    if kind == CHOW:
+        tiles = [TILE_IDS[index + i] for i in range(3)]
+    else:
+        tiles = [TILE_IDS[index]] * {PUNG: 3, EXPOSED_KONG: 4, CONCEALED_KONG: 5}[kind]
+    if aka:
+        tiles[tiles.index(TILE_IDS[AKA_INDICES[index // 9]])] = AKA_IDS[index // 9]
+    return tiles
+
+
+def _indicators(tiles: str):
+    res = [TILE_INDEX[tile + 5 if tile in AKA_IDS else tile] for tile in _checker.str2id(tiles)[0]] if tiles else []
+    return res + [EMPTY] * (5 - len(res))
+
+
+def encode_hands(hands):
+    """
+    :param hands: 可迭代的(tiles, hu_tile, {update的其余参数})，须含prevailing_wind与dealer_wind；
+        hu_tile为None时只能用于听牌计算，此时两者可省略
+    :return: HAND_DTYPE的数组
+    """
+    hands = list(hands)
+    records = np.zeros(len(hands), dtype=HAND_DTYPE)
+    for record, (tiles, hu_tile, kwargs) in zip(records, hands):
+        hand_tiles, called_tiles = _checker.str2id(tiles)
+        for tile in hand_tiles:
+            if tile in AKA_IDS:
+                record['aka'] |= 1 << AKA_IDS.index(tile)
+                tile += 5
+            record['hand'][TILE_INDEX[tile]] += 1
+        if hu_tile is None:
+            record['hu'] = EMPTY
+        else:
+            tile = _checker.str2id(hu_tile)[0][0]
+            record['hu_aka'] = tile in AKA_IDS
+            record['hu'] = TILE_INDEX[tile + 5 if tile in AKA_IDS else tile]
+        for i, meld in enumerate(called_tiles):
+            record['melds'][i] = _meld_record(meld)
+        for key in ('prevailing_wind', 'dealer_wind'):
+            """计分时为update的必需参数，不设默认值"""
+            record[key] = kwargs.get(key, 0) if hu_tile is None else kwargs[key]
+        for key in ('lichi', 'north_dora'):
+            record[key] = kwargs.get(key, 0)
+        record['flags'] = sum(1 << i for i, flag in enumerate(FLAGS) if kwargs.get(flag, DEFAULT_FLAGS.get(flag, False)))
+        record['dora'] = _indicators(kwargs.get('dora', ''))
+        record['ura_dora'] = _indicators(kwargs.get('ura_dora', ''))
+    return records
+
+
+def decode_hand(record):
+    """手牌记录 -> (手牌id, 副露id, 和了牌id或None)，赤宝牌还原为AKA_MAN等"""
+    hand_tiles = TILE_ID_ARRAY.repeat(record['hand']).tolist()
+    for s in range(3):
+        if record['aka'] >> s & 1:
+            hand_tiles[hand_tiles.index(TILE_IDS[AKA_INDICES[s]])] = AKA_IDS[s]
+    called_tiles = [_meld_tiles(kind, index, aka) for kind, index, aka in record['melds'].tolist() if kind != NO_MELD]
+    hu = int(record['hu'])
+    if hu == EMPTY:
+        return hand_tiles, called_tiles, None
+    return hand_tiles, called_tiles, AKA_IDS[hu // 9] if record['hu_aka'] else TILE_IDS[hu]
+
+
+def _indicator_str(indices):
+    return _checker.id2str([TILE_IDS[i] for i in indices.tolist() if i != EMPTY])
+
+
+def _attach(name, dtype, n):
+    """按名称映射共享内存；返回的数组引用shm，调用方须在数组用完后close"""
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray((n,), dtype=dtype, buffer=shm.buf)
+
+
+def _score_slice(in_name, out_name, n, start, stop):
+    """工作进程: 计算hands[start:stop]，结果写入records[start:stop]"""
+    calculator = ScoreCalculator()
+    in_shm, hands = _attach(in_name, HAND_DTYPE, n)
+    out_shm, records = _attach(out_name, RECORD_DTYPE, n)
+    try:
+        for i in range(start, stop):
+            record = hands[i]
+            hand_tiles, called_tiles, hu_tile = decode_hand(record)
+            flags = {flag: bool(record['flags'] >> j & 1) for j, flag in enumerate(FLAGS)}
+            dealer_wind = int(record['dealer_wind'])
+            calculator.__init__()
+            calculator._update(
+                '', hand_tiles, called_tiles, hu_tile, None, int(record['prevailing_wind']), dealer_wind,
+                lichi=int(record['lichi']), dora=_indicator_str(record['dora']),
+                ura_dora=_indicator_str(record['ura_dora']), north_dora=int(record['north_dora']), **flags
+            )
+            records[i] = from_calculator(calculator, dealer_wind == 1, flags['is_self_draw'])
+        del hands, records, record
+    finally:
+        in_shm.close()
+        out_shm.close()
+    return stop - start
+
+
+def _waits_slice(in_name, out_name, n, start, stop):
+    """工作进程: 计算hands[start:stop]的听牌，掩码写入masks[start:stop]"""
+    in_shm, hands = _attach(in_name, HAND_DTYPE, n)
+    out_shm, masks = _attach(out_name, np.uint64, n)
+    try:
+        for i in range(start, stop):
+            hand_tiles, called_tiles, _ = decode_hand(hands[i])
+            hand_tiles = sorted(tile + 5 if tile in AKA_IDS else tile for tile in hand_tiles)
+            called_tiles = [sorted(tile + 5 if tile in AKA_IDS else tile for tile in meld) for meld in called_tiles]
+            masks[i] = tiles_mask(_checker.ready_hand(hand_tiles, called_tiles))
+        del hands, masks
+    finally:
+        in_shm.close()
+        out_shm.close()
+    return stop - start
+
+
+def _run_shared(task, hands, out_dtype, workers=None, chunk_size=None):
+    n = len(hands)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, -(-n // (4 * max(1, workers))))
+    in_shm = shared_memory.SharedMemory(create=True, size=max(1, hands.nbytes))
+    out_shm = shared_memory.SharedMemory(create=True, size=max(1, n * np.dtype(out_dtype).itemsize))
+    try:
+        shared = np.ndarray((n,), dtype=HAND_DTYPE, buffer=in_shm.buf)
+        shared[:] = hands
+        ranges = [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+        args = [(in_shm.name, out_shm.name, n, start, stop) for start, stop in ranges]
+        if workers <= 1:
+            for arg in args:
+                task(*arg)
+        else:
+            with ProcessPoolExecutor(workers) as executor:
+                for future in [executor.submit(task, *arg) for arg in args]:
+                    future.result()
+        res = np.ndarray((n,), dtype=out_dtype, buffer=out_shm.buf).copy()
+        del shared
+        return res
+    finally:
+        for shm in (in_shm, out_shm):
+            shm.close()
+            shm.unlink()
+
+
+def score_shared(hands, workers=None, chunk_size=None):
+    """
+    多进程批量计分
+    :param hands: HAND_DTYPE的数组（见encode_hands）
+    :param workers: 工作进程数（None为CPU核数，0或1时在当前进程内计算）
+    :param chunk_size: 每个任务的手牌数，默认使每个进程约分到4个任务
+    :return: RECORD_DTYPE的数组，见mahjong.record
+    """
+    return _run_shared(_score_slice, hands, RECORD_DTYPE, workers, chunk_size)
+
+
+def waits_shared(hands, workers=None, chunk_size=None):
+    """
+    多进程批量听牌计算，参数同score_shared
+    :return: np.uint64数组，第i位表示听TILE_IDS[i]
+    """
+    return _run_shared(_waits_slice, hands, np.uint64, workers, chunk_size)
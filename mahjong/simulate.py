@@ -0,0 +1,178 @@
+"""
+蒙特卡洛和了率、期望得点模拟
+
+对14张手牌的每一种切牌，随机抽样剩余牌山，估计在剩余摸牌次数内自摸和了的概率与期望得点。
+打法假设: 切牌后手牌固定不变（摸切），只计自摸和了，不计荣和；牌山中的赤宝牌按普通五处理。
+听牌使用预计算听牌表，需先生成: python -m mahjong.wait_table
+"""
+import re
+import math
+from statistics import NormalDist
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+
+import numpy as np
+
+from mahjong.checker import Mahjong, ALL, AKA_DORA
+from mahjong.score import ScoreCalculator, total_points
+
+TABLE_SIZE = max(ALL) + 1
+
+
+def _playouts(seed, wall, win_tables, point_tables, draws, batch_size):
+    """
+    进行batch_size次模拟，所有切牌共用同一批牌山（公共随机数）
+    :return: 每种切牌的(和了次数, 得点和, 得点平方和)
+    """
+    rng = np.random.default_rng(seed)
+    keys = rng.random((batch_size, len(wall)))
+    order = np.argpartition(keys, draws - 1, axis=1)[:, :draws]
+    order = np.take_along_axis(order, np.take_along_axis(keys, order, axis=1).argsort(axis=1), axis=1)
+    drawn = wall[order]
+    rows = np.arange(batch_size)
+    wins = np.zeros(len(win_tables))
+    sums = np.zeros(len(win_tables))
+    squares = np.zeros(len(win_tables))
+    for i, (win_table, point_table) in enumerate(zip(win_tables, point_tables)):
+        hits = win_table[drawn]
+        won = hits.any(axis=1)
+        points = point_table[drawn[rows, hits.argmax(axis=1)]] * won
+        wins[i] = won.sum()
+        sums[i] = points.sum()
+        squares[i] = (points ** 2).sum()
+    return wins, sums, squares
+
+
+class WinSimulator:
+
+    def __init__(self, workers=None, batch_size=20000, max_playouts=1000000, tolerance=0.005, point_tolerance=100, confidence=0.95):
+        """
+        :param workers: 工作进程数（None为CPU核数，0或1时在当前进程内计算）
+        :param batch_size: 每个任务的模拟次数
+        :param max_playouts: 每种切牌最多模拟次数
+        :param tolerance: 和了率置信区间半宽度小于该值时提前结束
+        :param point_tolerance: 期望得点置信区间半宽度小于该值时提前结束
+        :param confidence: 置信水平
+        """
+        self.checker = Mahjong()
+        self.calculator = ScoreCalculator()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_playouts = max_playouts
+        self.tolerance = tolerance
+        self.point_tolerance = point_tolerance
+        self.z = NormalDist().inv_cdf((1 + confidence) / 2)
+
+    def wall(self, tiles: str, visible: str = ''):
+        """由手牌、副露与可见牌（牌河、宝牌指示牌等）求剩余牌山"""
+        counter = self.checker.unseen_counter(tiles, visible)
+        return np.array(sum([[tile] * counter[tile] for tile in sorted(ALL)], []), dtype=np.int64)
+
+    def discards(self, tiles: str, **context):
+        """
+        枚举切牌，计算每种切牌后的听牌及自摸各听牌的得点
+        :return: {切牌字符串: {听牌id: 得点}}
+        """
+        hand_tiles, called_tiles = self.checker.str2id(tiles)
+        if len(hand_tiles) + 3 * len(called_tiles) != 14:
+            raise ValueError('Wrong number of tiles!')
+        called_str = tiles.strip()[len(re.split(' +', tiles.strip())[0]):]
+        is_dealer = context['dealer_wind'] == 1
+        res = {}
+        for discard in sorted(set(hand_tiles), key=lambda x: (x + 5.5 if x in AKA_DORA else x)):
+            rest = list(hand_tiles)
+            rest.remove(discard)
+            rest_str = self.checker.id2str(rest) + called_str
+            waits = self.checker.calculate_ready_hand(rest_str, False, engine='table') or set()
+            points = {}
+            for tile in waits:
+                self.calculator.update(rest_str, self.checker.id2str([tile]), is_self_draw=True, **context)
+                if self.calculator.is_hu and self.calculator.has_yaku:
+                    points[tile] = total_points(self.calculator.score, is_dealer, True)
+            res[self.checker.id2str([discard])] = points
+        return res
+
+    def _converged(self, n, wins, sums, squares):
+        p = wins / n
+        mean = sums / n
+        var = np.maximum(squares / n - mean ** 2, 0)
+        return np.all(self.z * np.sqrt(p * (1 - p) / n) <= self.tolerance) \
+            and np.all(self.z * np.sqrt(var / n) <= self.point_tolerance)
+
+    def simulate(self, tiles: str, draws, visible: str = '', seed=0, **context) -> Dict[str, dict]:
+        """
+        :param tiles: 14张手牌字符串（含刚摸到的牌），副露以空格隔离
+        :param draws: 剩余自摸次数
+        :param visible: 可见牌字符串（牌河、宝牌指示牌等）
+        :param seed: 随机种子，相同种子与参数下结果可复现
+        :param context: 传给ScoreCalculator.update的其余参数（场风、自风、立直、宝牌等，不含is_self_draw）
+        :return: {切牌字符串: 和了率、期望得点、置信区间半宽度与模拟次数}
+        """
+        options = self.discards(tiles, **context)
+        wall = self.wall(tiles, visible)
+        draws = min(draws, len(wall))
+        names = list(options)
+        win_tables = np.zeros((len(names), TABLE_SIZE), dtype=bool)
+        point_tables = np.zeros((len(names), TABLE_SIZE))
+        for i, name in enumerate(names):
+            for tile, points in options[name].items():
+                win_tables[i, tile] = True
+                point_tables[i, tile] = points
+
+        n = 0
+        wins, sums, squares = np.zeros(len(names)), np.zeros(len(names)), np.zeros(len(names))
+        if draws > 0 and win_tables.any():
+            root = np.random.SeedSequence(seed)
+            tasks = math.ceil(self.max_playouts / self.batch_size)
+            args = [wall, win_tables, point_tables, draws, self.batch_size]
+            if self.workers in (0, 1):
+                results = (_playouts(child, *args) for child in root.spawn(tasks))
+                executor = None
+            else:
+                executor = ProcessPoolExecutor(self.workers)
+                results = executor.map(_playouts, root.spawn(tasks), *[[arg] * tasks for arg in args])
+            try:
+                for w, s, q in results:
+                    """按任务顺序累加，结果与工作进程数无关"""
+                    n += self.batch_size
+                    wins += w
+                    sums += s
+                    squares += q
+                    if self._converged(n, wins, sums, squares):
+                        break
+            finally:
+                if executor is not None:
+                    executor.shutdown(cancel_futures=True)
+
+        res = {}
+        for i, name in enumerate(names):
+            if n == 0:
+                res[name] = {'win_rate': 0., 'win_rate_ci': 0., 'expected_points': 0., 'expected_points_ci': 0., 'playouts': 0}
+                continue
+            p = float(wins[i] / n)
+            mean = float(sums[i] / n)
+            var = max(squares[i] / n - mean ** 2, 0)
+            res[name] = {
+                'win_rate': p,
+                'win_rate_ci': self.z * math.sqrt(p * (1 - p) / n),
+                'expected_points': mean,
+                'expected_points_ci': self.z * math.sqrt(var / n),
+                'playouts': n
+            }
+        return res
+
+
+if __name__ == '__main__':
+    simulator = WinSimulator()
+    result = simulator.simulate(
+        tiles='234567m345p56788s',
+        draws=10,
+        visible='1m9p',
+        prevailing_wind=1,
+        dealer_wind=2,
+        lichi=1,
+        dora='1m',
+        ura_dora=''
+    )
+    for discard, info in sorted(result.items(), key=lambda x: -x[1]['expected_points']):
+        print(discard, info)
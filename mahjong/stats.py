@@ -0,0 +1,134 @@
+"""
+计分结果的单遍统计
+
+逐个接收ScoreCalculator的结果摘要（_result、ResultCache.score、scenario_grid的每一行），累计
+役种出现次数、番数、符数、打点等级（满贯等，见SCORE_LEVELS）的分布，以及亲家、子家所得点数的分布与均值。
+各项均以{取值: 次数}的直方图保存：番数、符数、点数的取值种类有限，内存占用与手牌数量无关，
+分位数由直方图精确得出；并行计算时各工作进程分别统计，再以merge（或+）合并。
+用法:
+    stats = ScoreStats()
+    for (tiles, hu_tile, kwargs), result in zip(hands, cache.score_many(hands)):
+        stats.add(result, kwargs['dealer_wind'] == 1)
+    stats.summary()
+"""
+import re
+from collections import Counter
+
+YAKU_NAME = re.compile(r'^(.*?)\((?:\d+番|\d*倍?役满)\)$')
+
+
+def yaku_name(yaku: str):
+    """去掉役种的番数后缀: '一气通贯(2番)' -> '一气通贯'，'ドラ 3' -> 'ドラ'"""
+    if yaku.startswith('ドラ'):
+        return 'ドラ'
+    match = YAKU_NAME.match(yaku)
+    return match.group(1) if match else yaku
+
+
+def quantile(histogram: Counter, q):
+    """{取值: 次数}的q分位数（取不小于q比例的最小取值），直方图为空时为None"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        if seen >= rank:
+            return value
+    return max(histogram)
+
+
+class ScoreStats:
+
+    def __init__(self):
+        self.hands = 0
+        self.wins = 0
+        self.no_yaku = 0
+        self.yaku = Counter()
+        self.dora = 0
+        self.han = Counter()
+        self.fu = Counter()
+        self.levels = Counter()
+        self.points = {True: Counter(), False: Counter()}
+
+    def add(self, result: dict, is_dealer: bool):
+        """
+        :param result: 含'fu'、'han'、'level'、'points'、'yaku_list'、'has_yaku'的结果摘要
+        :param is_dealer: 和了者是否为亲家
+        """
+        self.hands += 1
+        if result['fu'] is None:
+            return
+        if not result['has_yaku']:
+            self.no_yaku += 1
+            return
+        self.wins += 1
+        for yaku in result['yaku_list']:
+            name = yaku_name(yaku)
+            self.yaku[name] += 1
+            if name == 'ドラ':
+                self.dora += int(yaku.split()[-1])
+        self.han[result['han']] += 1
+        self.fu[result['fu']] += 1
+        self.levels[result['level']] += 1
+        self.points[bool(is_dealer)][result['points']] += 1
+
+    def add_many(self, results, dealers):
+        for result, is_dealer in zip(results, dealers):
+            self.add(result, is_dealer)
+        return self
+
+    def merge(self, other: 'ScoreStats'):
+        """并入另一份统计（如其他工作进程的结果）"""
+        self.hands += other.hands
+        self.wins += other.wins
+        self.no_yaku += other.no_yaku
+        self.yaku.update(other.yaku)
+        self.dora += other.dora
+        self.han.update(other.han)
+        self.fu.update(other.fu)
+        self.levels.update(other.levels)
+        for is_dealer in (True, False):
+            self.points[is_dealer].update(other.points[is_dealer])
+        return self
+
+    def __add__(self, other: 'ScoreStats'):
+        return ScoreStats().merge(self).merge(other)
+
+    @staticmethod
+    def _mean(histogram: Counter):
+        total = sum(histogram.values())
+        return sum(value * n for value, n in histogram.items()) / total if total else None
+
+    def points_summary(self, is_dealer=None, quantiles=(0.25, 0.5, 0.75, 0.9, 0.99)):
+        """
+        :param is_dealer: None为亲家、子家合计
+        :return: {'count', 'mean', 'quantiles': {q: 点数}}
+        """
+        if is_dealer is None:
+            histogram = self.points[True] + self.points[False]
+        else:
+            histogram = self.points[bool(is_dealer)]
+        return {
+            'count': sum(histogram.values()),
+            'mean': self._mean(histogram),
+            'quantiles': {q: quantile(histogram, q) for q in quantiles}
+        }
+
+    def summary(self):
+        """统计结果（可直接序列化为JSON）"""
+        return {
+            'hands': self.hands,
+            'wins': self.wins,
+            'no_yaku': self.no_yaku,
+            'yaku_frequency': {name: n / self.wins for name, n in self.yaku.most_common()} if self.wins else {},
+            'dora_per_win': self.dora / self.wins if self.wins else None,
+            'mean_han': self._mean(self.han),
+            'mean_fu': self._mean(self.fu),
+            'han': dict(sorted(self.han.items())),
+            'fu': dict(sorted(self.fu.items())),
+            'levels': {level or '': n for level, n in self.levels.most_common()},
+            'dealer_points': self.points_summary(True),
+            'non_dealer_points': self.points_summary(False)
+        }
@@ -0,0 +1,174 @@
+"""
+按花色预计算的听牌表
+
+一种花色的拆分与听牌只取决于该花色九种牌的张数，故将每种张数组合（五进制编码，共5^9种）对应的
+拆分信息与听牌预先算出，写成只读二进制文件，使用时以mmap映射，同一台机器上的多个进程共享同一份页缓存。
+每个条目为一个uint32:
+    bit 0: 可完全拆为面子
+    bit 1: 可拆为面子+雀头
+    bit 2-10: 加入第i张牌后可完全拆为面子的听牌
+    bit 11-19: 加入第i张牌后可拆为面子+雀头的听牌
+生成: python -m mahjong.wait_table [输出路径]
+听牌表须在安装或部署时预先生成，使用时只读映射，不会在运行中生成。
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+from collections import Counter
+from typing import List
+
+import numpy as np
+
+from mahjong.checker import HONORS
+
+MAGIC = b'MJWT'
+VERSION = 1
+HEADER_SIZE = 16
+PATTERNS = 5 ** 9
+POW5 = 5 ** np.arange(9, dtype=np.int64)
+
+MELDS_ONLY = 1
+WITH_PAIR = 2
+WAIT_MELDS_SHIFT = 2
+WAIT_PAIR_SHIFT = 11
+
+DEFAULT_PATH = Path(__file__).resolve().parent / 'data' / 'wait_table.bin'
+
+
+def build_table():
+    """计算全部张数组合的拆分信息与听牌，返回uint32数组"""
+    index = np.arange(PATTERNS, dtype=np.int64)
+    digits = (index[:, None] // POW5[None, :]) % 5
+    sums = digits.sum(axis=1)
+    first = (digits > 0).argmax(axis=1)
+
+    melds_only = np.zeros(PATTERNS, dtype=bool)
+    melds_only[0] = True
+    for total in range(3, 15, 3):
+        idx = np.where(sums == total)[0]
+        f = first[idx]
+        d = digits[idx]
+        rows = np.arange(len(idx))
+        """最左边的牌只能作为刻子或顺子的第一张"""
+        ok = (d[rows, f] >= 3) & melds_only[idx - 3 * POW5[f]]
+        has_seq = f <= 6
+        f1 = np.minimum(f + 1, 8)
+        f2 = np.minimum(f + 2, 8)
+        has_seq &= (d[rows, f1] >= 1) & (d[rows, f2] >= 1)
+        seq_left = idx - POW5[f] - POW5[f1] - POW5[f2]
+        ok |= has_seq & melds_only[np.where(has_seq, seq_left, 0)]
+        melds_only[idx] = ok
+
+    with_pair = np.zeros(PATTERNS, dtype=bool)
+    candidates = np.where((sums % 3 == 2) & (sums <= 14))[0]
+    for i in range(9):
+        d = digits[candidates, i] >= 2
+        left = np.where(d, candidates - 2 * POW5[i], 0)
+        with_pair[candidates] |= d & melds_only[left]
+
+    table = melds_only.astype(np.uint32) * MELDS_ONLY | with_pair.astype(np.uint32) * WITH_PAIR
+    candidates = np.where(sums <= 13)[0]
+    for i in range(9):
+        d = digits[candidates, i] < 4
+        target = np.where(d, candidates + POW5[i], 0)
+        table[candidates] |= (d & melds_only[target]).astype(np.uint32) << (WAIT_MELDS_SHIFT + i)
+        table[candidates] |= (d & with_pair[target]).astype(np.uint32) << (WAIT_PAIR_SHIFT + i)
+    return table
+
+
+def write_table(path=DEFAULT_PATH):
+    """生成听牌表并原子地写入文件"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = build_table()
+    header = MAGIC + np.array([VERSION, PATTERNS, 0], dtype='<u4').tobytes()
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(table.astype('<u4').tobytes())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+
+class WaitTable:
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        version, patterns, _ = np.frombuffer(header[4:], dtype='<u4')
+        if header[:4] != MAGIC or version != VERSION or patterns != PATTERNS:
+            raise ValueError(f'Wrong wait table: {self.path}')
+        self.table = np.memmap(self.path, dtype='<u4', mode='r', offset=HEADER_SIZE, shape=(PATTERNS,))
+
+    def _units(self, counter: Counter):
+        """将手牌拆为三种花色与七种字牌，返回每一部分的(牌id列表, 条目)"""
+        units = []
+        for suit in range(3):
+            index = 0
+            for i in range(9):
+                index += counter[10 * suit + i] * 5 ** i
+            units.append((list(range(10 * suit, 10 * suit + 9)), int(self.table[index])))
+        for tile in sorted(HONORS):
+            n = counter[tile]
+            entry = (n in (0, 3)) * MELDS_ONLY | (n == 2) * WITH_PAIR
+            entry |= (n == 2) << WAIT_MELDS_SHIFT | (n == 1) << WAIT_PAIR_SHIFT
+            units.append(([tile], entry))
+        return units
+
+    def ready_hand(self, hand_tiles: List[int], called_count, total_counter: Counter):
+        """
+        由听牌表组合出听牌，与Mahjong.ready_hand(engine='dfs')中一般形、七对子的结果一致
+        :param hand_tiles: 已去除赤宝牌标记的手牌id
+        :param called_count: 副露数
+        :param total_counter: 手牌与副露中各牌的张数
+        """
+        res = set()
+        if len(hand_tiles) + 1 != 3 * (4 - called_count) + 2:
+            return res
+        counter = Counter(hand_tiles)
+        if called_count == 0 and len(counter) == 7 and sorted(counter.values()) == [1, 2, 2, 2, 2, 2, 2]:
+            """七对子"""
+            res.update(tile for tile, n in counter.items() if n == 1)
+        units = self._units(counter)
+        kinds = [entry & (MELDS_ONLY | WITH_PAIR) for _, entry in units]
+        incomplete = kinds.count(0)
+        pairs = kinds.count(WITH_PAIR)
+        for (tiles, entry), kind in zip(units, kinds):
+            other_incomplete = incomplete - (kind == 0)
+            other_pairs = pairs - (kind == WITH_PAIR)
+            if other_incomplete or other_pairs > 1:
+                continue
+            shift = WAIT_MELDS_SHIFT if other_pairs else WAIT_PAIR_SHIFT
+            for i, tile in enumerate(tiles):
+                if entry >> (shift + i) & 1 and total_counter[tile] < 4:
+                    res.add(tile)
+        return res
+
+
+_TABLES = {}
+
+
+def default_engine(path=DEFAULT_PATH):
+    """听牌表已生成时为'table'，否则为'dfs'"""
+    return 'table' if Path(path).exists() else 'dfs'
+
+
+def load_wait_table(path=DEFAULT_PATH):
+    """映射预先生成的听牌表，同一进程内只映射一次"""
+    path = Path(path)
+    if path not in _TABLES:
+        if not path.exists():
+            raise FileNotFoundError(f'Wait table not found: {path}, generate it with: python -m mahjong.wait_table {path}')
+        _TABLES[path] = WaitTable(path)
+    return _TABLES[path]
+
+
+if __name__ == '__main__':
+    print(write_table(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH))